@@ -0,0 +1,109 @@
+# Compare record extraction from a saved ChinaXIV OAI-PMH ListRecords response:
+# the whole-tree parse with per-call XPath strings the spider used to do, against
+# the spider's streaming parse with precompiled XPaths.
+#
+#     python benchmarks/bench_chinaxiv_parse.py [saved_response.xml] [--repeat N]
+#
+# The default fixture is a synthetic 100 record page in the shape of the real feed.
+
+import os
+import sys
+import time
+import datetime
+import argparse
+import tracemalloc
+
+from lxml import etree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "covid", "scraper"))
+
+from scraper.spiders.china_archive import (  # noqa: E402
+    ChinaXIVSpider,
+    RECORD_TAG,
+    extract_cursor,
+    extract_stub,
+    iter_oai_elements,
+)
+
+DEFAULT_FIXTURE = os.path.join(HERE, "fixtures", "chinaxiv_oai.xml")
+
+
+def extract_tree(body):
+    # What ChinaXIVSpider.parse did before: build the whole tree, then reparse an
+    # XPath string for every field of every record
+    xml_root = etree.fromstring(body)
+    nsmap = {k if k else "ns": v for k, v in xml_root.nsmap.items()}
+    cursor = xml_root.xpath("//ns:resumptionToken/text()", namespaces=nsmap)
+    records = []
+    for stub in xml_root.xpath("//ns:ListRecords/ns:record", namespaces=nsmap):
+        title, url, article_id, createtime, datestamp = (
+            stub.xpath(path, namespaces=nsmap).pop()
+            for path in (
+                "ns:metadata//*[local-name()='title']/text()",
+                "ns:metadata//*[local-name()='url']/text()",
+                "ns:metadata//*[local-name()='id']/text()",
+                "ns:metadata//*[local-name()='createtime']/text()",
+                "ns:header/ns:datestamp/text()",
+            )
+        )
+        posted = datetime.datetime.fromisoformat(createtime.strip("Z"))
+        records.append((title, url, "chinaxiv_" + article_id, posted, datestamp))
+    return cursor, records
+
+
+def extract_streaming(spider, body):
+    cursor = None
+    records = []
+    for element in iter_oai_elements(body):
+        if element.tag == RECORD_TAG:
+            stub = extract_stub(element)
+            records.append(
+                (
+                    spider._get_article_title(stub),
+                    spider._get_article_url(stub),
+                    spider._get_article_id(stub),
+                    spider._get_publication_date(stub),
+                    stub["datestamp"],
+                )
+            )
+        else:
+            cursor = extract_cursor(element)
+    return cursor, records
+
+
+def measure(name, extract, body, repeat):
+    tracemalloc.start()
+    _cursor, records = extract(body)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(body)
+    elapsed = time.perf_counter() - start
+    rate = len(records) * repeat / elapsed
+    print(f"{name:<10} {rate:>12,.0f} records/s {peak / 1024:>10,.0f} KiB peak")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default=DEFAULT_FIXTURE)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        body = f.read()
+    spider = ChinaXIVSpider()
+
+    assert extract_tree(body)[1] == extract_streaming(spider, body)[1]
+    tree_rate = measure("tree", extract_tree, body, args.repeat)
+    streaming_rate = measure(
+        "streaming", lambda b: extract_streaming(spider, b), body, args.repeat
+    )
+    print(f"speedup    {streaming_rate / tree_rate:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
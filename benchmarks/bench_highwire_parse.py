@@ -0,0 +1,90 @@
+# Compare extracting the articles of a saved medRxiv/bioRxiv listing page with the
+# per-article CSS selectors ArchiveSpiderBase used to run, against the precompiled
+# single walk extractor it uses now. Only extraction is timed, both sides share the
+# same parsed tree.
+#
+#     python benchmarks/bench_highwire_parse.py [saved_listing.html] [--repeat N]
+#
+# The default fixture is a synthetic 30 article page in the shape of the real listing.
+
+import os
+import sys
+import time
+import argparse
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "covid", "scraper"))
+
+from scraper.spiders.bio_med_archives import extract_listing  # noqa: E402
+
+DEFAULT_FIXTURE = os.path.join(HERE, "fixtures", "medrxiv_listing.html")
+
+
+def extract_selectors(response):
+    # What ArchiveSpiderBase.parse and _list_item_parser did before
+    sections = []
+    for section in response.css("div.pane-content > div.highwire-list-wrapper"):
+        date_string = section.css("h3.highwire-list-title::text").get()
+        articles = []
+        for item in section.css("div > ul > li"):
+            data = {
+                "title": item.css(
+                    "span.highwire-cite-title > a > span.highwire-cite-title::text"
+                ).get(),
+                "doi": item.css("span.highwire-cite-metadata-doi::text").get(),
+                "url": item.css('span.highwire-cite-title > a::attr("href")').get(),
+            }
+            for key in data.keys():
+                value = data[key]
+                if value:
+                    data[key] = value.strip()
+            if data["doi"]:
+                data["doi"] = urlparse(data["doi"]).path.strip("/")
+            articles.append(data)
+        sections.append((date_string, articles))
+    return sections
+
+
+def extract_compiled(response):
+    sections = extract_listing(response.selector.root)
+    for _date_string, articles in sections:
+        for data in articles:
+            if data["doi"]:
+                _scheme, _separator, rest = data["doi"].partition("://")
+                data["doi"] = rest.partition("/")[2].strip("/")
+    return sections
+
+
+def measure(name, extract, response, repeat):
+    count = sum(len(articles) for _date, articles in extract(response))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract(response)
+    elapsed = time.perf_counter() - start
+    rate = count * repeat / elapsed
+    print(f"{name:<10} {rate:>12,.0f} items/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default=DEFAULT_FIXTURE)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        body = f.read()
+    response = HtmlResponse("https://www.medrxiv.org/content/early/recent", body=body)
+    response.selector  # parse the tree up front, it is not what we are timing
+
+    assert extract_selectors(response) == extract_compiled(response)
+    selector_rate = measure("selectors", extract_selectors, response, args.repeat)
+    compiled_rate = measure("compiled", extract_compiled, response, args.repeat)
+    print(f"speedup    {compiled_rate / selector_rate:>12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Compare the memory held by pending articles as the loose dicts the spiders used to
+# emit, against ArticleItem.
+#
+#     python benchmarks/bench_item_memory.py [--count N]
+
+import os
+import sys
+import argparse
+import datetime
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "covid", "scraper"))
+
+from scraper.items import ArticleItem  # noqa: E402
+
+POSTED = datetime.date(2020, 3, 13)
+
+
+def make_dict(i):
+    return {
+        "title": f"Title {i}",
+        "doi": f"10.1101/2020.03.{i:08d}",
+        "url": f"https://www.medrxiv.org/content/10.1101/2020.03.{i:08d}v2",
+        "id": f"medrxiv_2020.03.{i:08d}",
+        "is_revision": True,
+        "posted": POSTED.strftime("%Y-%m-%d"),
+    }
+
+
+def make_item(i):
+    return ArticleItem(
+        title=f"Title {i}",
+        doi=f"10.1101/2020.03.{i:08d}",
+        url=f"https://www.medrxiv.org/content/10.1101/2020.03.{i:08d}v2",
+        id=f"medrxiv_2020.03.{i:08d}",
+        is_revision=True,
+        posted=POSTED.toordinal(),
+    )
+
+
+def measure(name, make, count):
+    tracemalloc.start()
+    articles = [make(i) for i in range(count)]
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_item = size / len(articles)
+    print(f"{name:<12} {per_item:>8,.0f} bytes/article")
+    return per_item
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    dict_size = measure("dict", make_dict, args.count)
+    item_size = measure("ArticleItem", make_item, args.count)
+    print(f"saving       {1 - item_size / dict_size:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
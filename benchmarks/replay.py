@@ -0,0 +1,298 @@
+# Replay recorded responses through each spider's callbacks, without the network,
+# and report items/s, requests per item, peak memory and callback latencies.
+#
+#     python benchmarks/replay.py [spider ...] [--repeat N] [--compare earlier.json]
+#
+# Responses come from fixtures/replay/routes.json: for each spider, a list of URL
+# regexes and the file that answers them, where the first match wins. A request that
+# no route matches is counted as unmatched and dropped. With --record it is fetched
+# live instead, saved, and added as a route, so a real crawl can be captured once and
+# replayed from then on.
+#
+# Results are saved to benchmarks/results/ as JSON, and --compare prints the change
+# against an earlier results file. Peak memory is what tracemalloc sees, which leaves
+# out lxml's own allocations.
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import datetime
+import tempfile
+import subprocess
+import tracemalloc
+from collections import defaultdict, deque
+
+from scrapy import signals
+from scrapy.http import Request
+from scrapy.responsetypes import responsetypes
+from scrapy.settings import Settings
+from scrapy.utils.reactor import install_reactor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "covid", "scraper"))
+
+install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+
+from scrapy.utils.test import get_crawler  # noqa: E402
+
+from scraper.spiders.bio_med_archives import MedRXIVSpider  # noqa: E402
+from scraper.spiders.chem_archive import ChemRXIVSpider  # noqa: E402
+from scraper.spiders.china_archive import ChinaXIVSpider  # noqa: E402
+
+FIXTURES = os.path.join(HERE, "fixtures", "replay")
+ROUTES_PATH = os.path.join(FIXTURES, "routes.json")
+RESULTS = os.path.join(HERE, "results")
+
+SPIDERS = {
+    "medrxiv": MedRXIVSpider,
+    "chemrxiv": ChemRXIVSpider,
+    "chinaxiv": ChinaXIVSpider,
+}
+BOOKMARK = "2020-01-01"
+PERCENTILES = (50, 90, 99)
+
+# Per crawl stores, relative to the project's .scrapy directory, that a replay points
+# at a temporary directory instead
+STORE_SETTINGS = (
+    "BOOKMARK_STORE_PATH",
+    "POSTED_DATE_CACHE_PATH",
+    "SEEN_INDEX_PATH",
+    "COLUMNAR_STORE_DIR",
+)
+
+
+class Router:
+    def __init__(self, path, record=False):
+        self.path = path
+        self.record = record
+        with open(path) as f:
+            self.routes = json.load(f)
+
+    def find(self, spider_name, url):
+        for route in self.routes.get(spider_name, []):
+            if re.search(route["match"], url):
+                return route
+        if self.record:
+            return self._record(spider_name, url)
+        return None
+
+    def _record(self, spider_name, url):
+        import requests
+
+        live = requests.get(url, timeout=60)
+        content_type = live.headers.get("Content-Type", "text/html").split(";")[0]
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        filename = f"{spider_name}_{digest}"
+        with open(os.path.join(os.path.dirname(self.path), filename), "wb") as f:
+            f.write(live.content)
+        route = {
+            "match": "^" + re.escape(url) + "$",
+            "file": filename,
+            "content_type": content_type,
+            "status": live.status_code,
+        }
+        # Exact URLs go first, ahead of the catch all patterns
+        self.routes.setdefault(spider_name, []).insert(0, route)
+        with open(self.path, "w") as f:
+            json.dump(self.routes, f, indent=2)
+        return route
+
+    def respond(self, route, request):
+        with open(os.path.join(os.path.dirname(self.path), route["file"]), "rb") as f:
+            body = f.read()
+        headers = {"Content-Type": route["content_type"]}
+        response_cls = responsetypes.from_args(
+            headers=headers, url=request.url, body=body
+        )
+        return response_cls(
+            request.url,
+            status=route.get("status", 200),
+            headers=headers,
+            body=body,
+            request=request,
+        )
+
+
+def project_settings(store_dir):
+    settings = Settings()
+    settings.setmodule("scraper.settings", priority="project")
+    for name in STORE_SETTINGS:
+        settings.set(name, os.path.join(store_dir, settings.get(name)))
+    return settings.copy_to_dict()
+
+
+def replay(spider_cls, router):
+    """Crawl one spider from the recorded responses, returns its measurements."""
+    store_dir = tempfile.mkdtemp(prefix="replay-")
+    try:
+        crawler = get_crawler(spider_cls, project_settings(store_dir))
+        # The recorded titles are placeholders, keep every article
+        spider = spider_cls.from_crawler(crawler, bookmark=BOOKMARK, relevance="all")
+        crawler.spider = spider
+        crawler.signals.send_catch_log(signals.spider_opened, spider=spider)
+        queue = deque(Request(url, callback=spider.parse) for url in spider.start_urls)
+        seen_urls = set()
+        latencies = defaultdict(list)
+        items = requests = unmatched = 0
+
+        start = time.perf_counter()
+        while queue:
+            request = queue.popleft()
+            if not request.dont_filter and request.url in seen_urls:
+                continue
+            seen_urls.add(request.url)
+            route = router.find(spider.name, request.url)
+            if route is None:
+                unmatched += 1
+                continue
+            requests += 1
+            response = router.respond(route, request)
+            callback = request.callback or spider.parse
+            callback_start = time.perf_counter()
+            outputs = list(callback(response, **request.cb_kwargs))
+            latencies[callback.__name__].append(time.perf_counter() - callback_start)
+            for output in outputs:
+                if isinstance(output, Request):
+                    queue.append(output)
+                else:
+                    items += 1
+        elapsed = time.perf_counter() - start
+
+        crawler.signals.send_catch_log(
+            signals.spider_closed, spider=spider, reason="finished"
+        )
+        return {
+            "items": items,
+            "requests": requests,
+            "unmatched": unmatched,
+            "elapsed": elapsed,
+            "latencies": latencies,
+        }
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def benchmark(spider_cls, router, repeat):
+    # Warm up first, so lazy imports and caches are not counted as the crawl's memory
+    replay(spider_cls, router)
+    tracemalloc.start()
+    replay(spider_cls, router)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runs = [replay(spider_cls, router) for _ in range(repeat)]
+    latencies = defaultdict(list)
+    for run in runs:
+        for name, values in run["latencies"].items():
+            latencies[name].extend(values)
+    items, requests = runs[0]["items"], runs[0]["requests"]
+    elapsed = sum(run["elapsed"] for run in runs)
+    return {
+        "items": items,
+        "requests": requests,
+        "unmatched": runs[0]["unmatched"],
+        "items_per_second": items * repeat / elapsed if elapsed else 0.0,
+        "requests_per_item": requests / items if items else None,
+        "peak_memory_kib": peak / 1024,
+        "callbacks": {
+            name: dict(
+                calls=len(values) // repeat,
+                **{f"p{q}_ms": percentile(values, q) * 1000 for q in PERCENTILES},
+            )
+            for name, values in sorted(latencies.items())
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(name, result, earlier=None):
+    def change(key, value):
+        if not earlier or not earlier.get(key) or value is None:
+            return ""
+        return f" ({(value - earlier[key]) / earlier[key]:+.1%})"
+
+    rate, per_item = result["items_per_second"], result["requests_per_item"]
+    print(f"{name}")
+    print(f"  items            {result['items']:>10}")
+    print(f"  items/s          {rate:>10,.0f}{change('items_per_second', rate)}")
+    if per_item is not None:
+        print(
+            f"  requests/item    {per_item:>10.3f}"
+            f"{change('requests_per_item', per_item)}"
+        )
+    peak = result["peak_memory_kib"]
+    print(f"  peak memory KiB  {peak:>10,.0f}{change('peak_memory_kib', peak)}")
+    if result["unmatched"]:
+        print(f"  unmatched        {result['unmatched']:>10}")
+    for callback, latency in result["callbacks"].items():
+        percentiles = " ".join(f"p{q}={latency[f'p{q}_ms']:.3f}ms" for q in PERCENTILES)
+        print(f"  {callback:<20} x{latency['calls']:<4} {percentiles}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("spiders", nargs="*", metavar="spider")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--routes", default=ROUTES_PATH)
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--output", help="results file, by default in results/")
+    parser.add_argument("--compare", help="an earlier results file")
+    args = parser.parse_args()
+    unknown = set(args.spiders) - set(SPIDERS)
+    if unknown:
+        parser.error(f"unknown spiders {sorted(unknown)}, choose from {list(SPIDERS)}")
+
+    router = Router(args.routes, record=args.record)
+    earlier = {}
+    if args.compare:
+        with open(args.compare) as f:
+            earlier = json.load(f)["spiders"]
+
+    results = {}
+    for name in args.spiders or list(SPIDERS):
+        results[name] = benchmark(SPIDERS[name], router, args.repeat)
+        report(name, results[name], earlier.get(name))
+
+    created = datetime.datetime.now()
+    output = args.output or os.path.join(
+        RESULTS, f"replay-{created.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "created": created.isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "repeat": args.repeat,
+                "spiders": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Bookmarks track how far back each spider should scrape. A spider stops following
+# pages once they are older than its bookmark, and after a successful run the newest
+# date it saw becomes the bookmark for the next run.
+
+import os
+import json
+import fcntl
+import datetime
+from contextlib import contextmanager
+
+from scrapy import signals
+
+from scraper.utils import data_file_path
+
+BOOKMARK_DATE_FORMAT = "%Y-%m-%d"
+
+# Used when a spider has neither a stored bookmark nor a setting
+DEFAULT_BOOKMARK = datetime.datetime(year=2020, month=1, day=1)
+
+
+class BookmarkStore:
+    """JSON file mapping spider names to their high-water mark dates.
+
+    Spiders crawled in several processes, see scraper/run.py, share the file, so
+    `set` holds an exclusive lock on a ".lock" file next to it while it updates it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(data_file_path(settings.get("BOOKMARK_STORE_PATH")))
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, name):
+        date_string = self._load().get(name)
+        if date_string is None:
+            return None
+        return parse_bookmark(date_string)
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def set(self, name, date):
+        # Never move a bookmark backwards, a backfill should not undo a later crawl
+        date_string = date.strftime(BOOKMARK_DATE_FORMAT)
+        with self._locked():
+            bookmarks = self._load()
+            if bookmarks.get(name, "") >= date_string:
+                return
+            bookmarks[name] = date_string
+            # Write then rename, so a crash never leaves a half written file behind
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(bookmarks, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def parse_bookmark(date_string):
+    return datetime.datetime.strptime(date_string, BOOKMARK_DATE_FORMAT)
+
+
+class BookmarkMixin:
+    # Overridden from the command line for backfills: `scrapy crawl <name> -a
+    # bookmark=2020-01-01`. Otherwise the stored high-water mark, less the overlap
+    # window, is used.
+    bookmark = None
+    bookmark_date = DEFAULT_BOOKMARK
+    bookmark_store = None
+    high_water_mark = None
+    # Set once paging has reached the bookmark, or run out of pages, and when a
+    # listing request fails. Only a complete run moves the bookmark.
+    paging_complete = False
+    paging_failed = False
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.bookmark_store = BookmarkStore.from_settings(crawler.settings)
+        spider.bookmark_date = spider._resolve_bookmark(crawler.settings)
+        spider.logger.info(f"Scraping back to bookmark: {spider.bookmark_date}")
+        crawler.signals.connect(spider._save_bookmark, signal=signals.spider_closed)
+        return spider
+
+    def _resolve_bookmark(self, settings):
+        if self.bookmark:
+            return parse_bookmark(self.bookmark)
+        stored = self.bookmark_store.get(self.name)
+        if stored is not None:
+            overlap_days = settings.getint("BOOKMARK_OVERLAP_DAYS")
+            return stored - datetime.timedelta(days=overlap_days)
+        return parse_bookmark(settings.get("BOOKMARK_DEFAULT"))
+
+    def _is_page_new(self, date):
+        return date > self.bookmark_date
+
+    def _observe_date(self, date):
+        if self.high_water_mark is None or date > self.high_water_mark:
+            self.high_water_mark = date
+
+    def _complete_paging(self):
+        self.paging_complete = True
+
+    def listing_failed(self, failure):
+        # The errback of listing requests, the pages after a failed one are never
+        # reached, so the run must not move the bookmark
+        self.paging_failed = True
+        self.crawler.stats.inc_value("bookmark/listing_failed")
+        self.logger.error(
+            f"Listing request failed, bookmark will not move: {failure.request.url} "
+            f"{failure.value!r}"
+        )
+
+    def _is_complete_run(self, reason):
+        return reason == "finished" and self.paging_complete and not self.paging_failed
+
+    def _save_bookmark(self, spider, reason):
+        # Only a complete run may move the bookmark forward, otherwise the pages
+        # between the old bookmark and where the run stopped would never be scraped.
+        # A crawl also "finishes" when a listing request fails, or paging stops on an
+        # error in a callback, so paging must have reached its end without failures.
+        if not self._is_complete_run(reason):
+            if reason == "finished":
+                self.logger.warning("Paging did not complete, bookmark not saved")
+            return
+        if self.high_water_mark is None:
+            return
+        self.bookmark_store.set(self.name, self.high_water_mark)
+        self.logger.info(f"Saved bookmark: {self.high_water_mark}")
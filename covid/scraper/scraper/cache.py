@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# An on-disk cache of article posted dates, shared by the medRxiv and bioRxiv
+# spiders, so that repeated crawls do not resolve the same revisions again.
+
+import sqlite3
+import datetime
+import time
+
+from scraper.utils import data_file_path
+
+POSTED_DATE_FORMAT = "%Y-%m-%d"
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class PostedDateCache:
+    """SQLite backed mapping of article key (DOI or URL) to posted date.
+
+    Negative results, i.e. the lookup found no date, are stored as NULL and expire
+    after `negative_ttl` seconds rather than `ttl`. Entries are evicted by age on open
+    and close, and by age of insertion once there are more than `max_entries`.
+    """
+
+    def __init__(self, path, ttl, negative_ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS posted_dates "
+            "(key TEXT PRIMARY KEY, posted TEXT, stored_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS posted_dates_stored_at "
+            "ON posted_dates (stored_at)"
+        )
+        self.evict()
+
+    @classmethod
+    def from_settings(cls, settings):
+        path = data_file_path(settings.get("POSTED_DATE_CACHE_PATH"))
+        return cls(
+            path,
+            ttl=settings.getfloat("POSTED_DATE_CACHE_TTL_DAYS") * DAY_SECONDS,
+            negative_ttl=settings.getfloat("POSTED_DATE_CACHE_NEGATIVE_TTL_DAYS")
+            * DAY_SECONDS,
+            max_entries=settings.getint("POSTED_DATE_CACHE_MAX_ENTRIES"),
+        )
+
+    def get(self, key):
+        # Returns a pair of (hit, date), a negative hit is (True, None)
+        row = self.connection.execute(
+            "SELECT posted, stored_at FROM posted_dates WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            posted, stored_at = row
+            ttl = self.ttl if posted else self.negative_ttl
+            if stored_at + ttl > time.time():
+                if posted:
+                    self.hits += 1
+                    date = datetime.datetime.strptime(posted, POSTED_DATE_FORMAT)
+                    return True, date
+                else:
+                    self.negative_hits += 1
+                    return True, None
+        self.misses += 1
+        return False, None
+
+    def set(self, key, date):
+        posted = date.strftime(POSTED_DATE_FORMAT) if date else None
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO posted_dates VALUES (?, ?, ?)",
+                (key, posted, time.time()),
+            )
+
+    def evict(self):
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM posted_dates "
+                "WHERE (posted IS NOT NULL AND stored_at < ?) "
+                "OR (posted IS NULL AND stored_at < ?)",
+                (now - self.ttl, now - self.negative_ttl),
+            )
+            self.connection.execute(
+                "DELETE FROM posted_dates WHERE key IN ("
+                "SELECT key FROM posted_dates ORDER BY stored_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+# Checkpoints let a long crawl, e.g. a backfill, be restarted where it stopped:
+#
+#     scrapy crawl chinaxiv -a checkpoint=on -a bookmark=2020-01-01
+#
+# Every request the spider yields, listing pages with their OAI resumption token or
+# ChemRxiv cursor as much as article pages with their `cb_kwargs`, is written to a
+# SQLite file per spider rather than handed to Scrapy's scheduler. The spider feeds
+# the scheduler from the file, a batch at a time, so memory stays bounded however
+# many requests are pending. A request is marked done, along with the spider's own
+# paging state, once its callback has run. A restarted crawl with `-a checkpoint=on`
+# carries on with the requests that were not done, and the checkpoint is deleted
+# once a crawl finishes.
+
+import os
+import pickle
+import sqlite3
+
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.request import request_from_dict
+
+from scraper.utils import data_file_path
+
+
+class Checkpoint:
+    """Pending requests and spider state of one crawl, in a SQLite file.
+
+    Requests are keyed by fingerprint, so one that was queued before, or is done,
+    is not queued again. Changes are only durable once committed, the spider commits
+    after each callback.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS requests ("
+            "id INTEGER PRIMARY KEY, fingerprint TEXT UNIQUE, priority INTEGER, "
+            "request BLOB, state TEXT)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS requests_by_state "
+            "ON requests (state, priority DESC, id)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB)"
+        )
+        self.connection.commit()
+
+    @classmethod
+    def from_settings(cls, settings, spider_name):
+        directory = settings.get("CHECKPOINT_DIR")
+        return cls(data_file_path(os.path.join(directory, spider_name + ".sqlite")))
+
+    def resume(self):
+        # Requests handed out by a crawl that stopped are queued again. Returns how
+        # many requests are pending, none for a new crawl.
+        self.connection.execute(
+            "UPDATE requests SET state = 'queued' WHERE state = 'leased'"
+        )
+        self.connection.commit()
+        return self.pending()
+
+    def push(self, fingerprint, priority, request_dict):
+        # Returns False for a request that was queued before
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO requests VALUES (NULL, ?, ?, ?, 'queued')",
+            (fingerprint, priority, pickle.dumps(request_dict)),
+        )
+        return cursor.rowcount == 1
+
+    def pop(self, limit):
+        # Returns [(request id, request dict)], the highest priority first
+        rows = self.connection.execute(
+            "SELECT id, request FROM requests WHERE state = 'queued' "
+            "ORDER BY priority DESC, id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        self.connection.executemany(
+            "UPDATE requests SET state = 'leased' WHERE id = ?",
+            [(request_id,) for request_id, _ in rows],
+        )
+        return [(request_id, pickle.loads(request)) for request_id, request in rows]
+
+    def complete(self, request_id):
+        self.connection.execute(
+            "UPDATE requests SET state = 'done', request = NULL WHERE id = ?",
+            (request_id,),
+        )
+
+    def pending(self):
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM requests WHERE state IN ('queued', 'leased')"
+        ).fetchone()
+        return count
+
+    def save_state(self, state):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state VALUES ('spider', ?)", (pickle.dumps(state),)
+        )
+
+    def load_state(self):
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = 'spider'"
+        ).fetchone()
+        return {} if row is None else pickle.loads(row[0])
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self, delete=False):
+        self.connection.commit()
+        self.connection.close()
+        if delete:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
+
+
+class CheckpointMixin:
+    # "off" crawls as before, "on" keeps the crawl's requests in a checkpoint, and
+    # resumes from it if there is one. Set with `scrapy crawl <name> -a checkpoint=on`.
+    checkpoint = "off"
+    checkpoint_store = None
+    # Spider attributes saved with the checkpoint, a subclass adds its paging state
+    checkpoint_attributes = ("high_water_mark", "paging_complete", "paging_failed")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.checkpoint not in ("off", "on"):
+            raise ValueError(f"Unknown checkpoint: {spider.checkpoint}")
+        if spider.checkpoint == "on":
+            if spider.role != "standalone":
+                raise ValueError("Only a standalone crawl can be checkpointed")
+            spider.checkpoint_store = Checkpoint.from_settings(
+                crawler.settings, spider.name
+            )
+            spider.checkpoint_memory = crawler.settings.getint(
+                "CHECKPOINT_MEMORY_REQUESTS"
+            )
+            crawler.signals.connect(spider._checkpoint_idle, signal=signals.spider_idle)
+            crawler.signals.connect(
+                spider._close_checkpoint, signal=signals.spider_closed
+            )
+        return spider
+
+    def start_requests(self):
+        if self.checkpoint_store is None:
+            return super().start_requests()
+        pending = self.checkpoint_store.resume()
+        if pending:
+            self.logger.info(f"Resuming from checkpoint, {pending} requests pending")
+            for name, value in self.checkpoint_store.load_state().items():
+                setattr(self, name, value)
+        else:
+            for request in super().start_requests():
+                self._checkpoint_push(request)
+            self.checkpoint_store.commit()
+        return self._checkpoint_pop(self.checkpoint_memory)
+
+    def _checkpoint_push(self, request):
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+        request_dict = request.to_dict(spider=self)
+        if self.checkpoint_store.push(fingerprint, request.priority, request_dict):
+            self.crawler.stats.inc_value("checkpoint/queued")
+
+    def _checkpoint_pop(self, limit):
+        requests = []
+        for request_id, request_dict in self.checkpoint_store.pop(limit):
+            # Queued once only, a request must not be dropped as a duplicate
+            request = request_from_dict(request_dict, spider=self)
+            request.meta["checkpoint_request"] = request_id
+            request.dont_filter = True
+            requests.append(request)
+        return requests
+
+    def _checkpoint_complete(self, request_id):
+        # Saves the request's outcome, and the state it left the spider in, at once
+        self.checkpoint_store.complete(request_id)
+        self.checkpoint_store.save_state(
+            {name: getattr(self, name) for name in self.checkpoint_attributes}
+        )
+        self.checkpoint_store.commit()
+        self.crawler.stats.inc_value("checkpoint/done")
+
+    def _checkpoint_feed(self):
+        # Keep up to `checkpoint_memory` requests in Scrapy's hands, the rest wait
+        # on disk. Returns the number of requests scheduled.
+        engine = self.crawler.engine
+        scheduled = len(engine.scheduler) + len(engine.downloader.active)
+        requests = self._checkpoint_pop(max(0, self.checkpoint_memory - scheduled))
+        for request in requests:
+            engine.crawl(request)
+        return len(requests)
+
+    def _checkpoint_idle(self, spider):
+        if self._checkpoint_feed():
+            raise DontCloseSpider
+
+    def _close_checkpoint(self, spider, reason):
+        # A finished crawl has nothing left to resume
+        finished = reason == "finished"
+        if finished:
+            self.logger.info("Crawl finished, checkpoint deleted")
+        else:
+            pending = self.checkpoint_store.pending()
+            self.logger.info(f"Checkpoint saved, {pending} requests pending")
+        self.checkpoint_store.close(delete=finished)
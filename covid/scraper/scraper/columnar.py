@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+# A columnar on-disk store of scraped articles for time-series analysis.
+#
+# Articles are partitioned by archive and by the month they were posted in:
+#
+#     <root>/<archive>/<YYYY-MM>/posted.i4       little-endian int32 date ordinals
+#     <root>/<archive>/<YYYY-MM>/is_revision.u1  uint8 flags
+#     <root>/<archive>/<YYYY-MM>/is_duplicate.u1 uint8 flags
+#     <root>/<archive>/<YYYY-MM>/ids.txt         article ids, one per line
+#     <root>/<archive>/daily_counts.json         {"YYYY-MM-DD": [new, revisions]}
+#
+# The files of a partition are row aligned. The column files are raw arrays, so
+# they load with `array.fromfile`, or `numpy.fromfile` and `numpy.memmap`, without
+# any parsing. An article is a duplicate when it is in the near-duplicate cluster of
+# an article on another archive, see scraper/duplicates.py. Partitions written before
+# the duplicate column existed are taken to have no duplicates.
+
+import os
+import sys
+import json
+import datetime
+
+from array import array
+
+POSTED_DATE_FORMAT = "%Y-%m-%d"
+PARTITION_FORMAT = "%Y-%m"
+
+POSTED_FILE = "posted.i4"
+IS_REVISION_FILE = "is_revision.u1"
+IS_DUPLICATE_FILE = "is_duplicate.u1"
+IDS_FILE = "ids.txt"
+DAILY_COUNTS_FILE = "daily_counts.json"
+
+
+def _to_little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _partition_months(start, end):
+    # Every YYYY-MM partition name from the month of `start` to that of `end`
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class ColumnarStore:
+    """Append-only, deduplicated, columnar store of articles per archive.
+
+    Each row is an article's id, posted date, and revision and duplicate flags.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.ids = {}  # archive -> set of stored ids, loaded when first needed
+        # (archive, partition) -> ([ids], array posted, array flags, array duplicates)
+        self.buffers = {}
+
+    def _archive_path(self, archive):
+        return os.path.join(self.root, archive)
+
+    def _partitions(self, archive):
+        path = self._archive_path(archive)
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path) if name[:4].isdigit())
+
+    def _stored_ids(self, archive):
+        if archive not in self.ids:
+            ids = set()
+            for partition in self._partitions(archive):
+                path = os.path.join(self._archive_path(archive), partition, IDS_FILE)
+                with open(path) as f:
+                    ids.update(line.rstrip("\n") for line in f)
+            self.ids[archive] = ids
+        return self.ids[archive]
+
+    def append(self, archive, article_id, posted, is_revision, is_duplicate=False):
+        # Returns False, and stores nothing, for an id that is already stored
+        ids = self._stored_ids(archive)
+        if article_id in ids:
+            return False
+        ids.add(article_id)
+        partition = datetime.date.fromordinal(posted).strftime(PARTITION_FORMAT)
+        key = (archive, partition)
+        if key not in self.buffers:
+            self.buffers[key] = ([], array("i"), array("B"), array("B"))
+        buffered_ids, buffered_posted, buffered_flags, buffered_duplicates = (
+            self.buffers[key]
+        )
+        buffered_ids.append(article_id)
+        buffered_posted.append(posted)
+        buffered_flags.append(bool(is_revision))
+        buffered_duplicates.append(bool(is_duplicate))
+        return True
+
+    def buffered(self):
+        return sum(len(columns[0]) for columns in self.buffers.values())
+
+    def flush(self):
+        archives = set()
+        for (archive, partition), columns in self.buffers.items():
+            ids, posted, flags, duplicates = columns
+            path = os.path.join(self._archive_path(archive), partition)
+            os.makedirs(path, exist_ok=True)
+            # Ids last, so a crash part way through leaves ids unstored, not orphaned
+            rows = self._stored_rows(path)
+            with open(os.path.join(path, POSTED_FILE), "ab") as f:
+                _to_little_endian(posted).tofile(f)
+            with open(os.path.join(path, IS_REVISION_FILE), "ab") as f:
+                flags.tofile(f)
+            with open(os.path.join(path, IS_DUPLICATE_FILE), "ab") as f:
+                # Pad a partition written before the column existed
+                f.seek(0, os.SEEK_END)
+                f.write(bytes(max(0, rows - f.tell())))
+                duplicates.tofile(f)
+            with open(os.path.join(path, IDS_FILE), "a") as f:
+                f.writelines(article_id + "\n" for article_id in ids)
+            _to_little_endian(posted)
+            archives.add(archive)
+        for archive in archives:
+            self._update_daily_counts(archive)
+        self.buffers = {}
+
+    def _update_daily_counts(self, archive):
+        counts = self.daily_counts(archive)
+        for (buffered_archive, _partition), columns in self.buffers.items():
+            if buffered_archive != archive:
+                continue
+            _ids, posted, flags, _duplicates = columns
+            for ordinal, is_revision in zip(posted, flags):
+                day = datetime.date.fromordinal(ordinal).strftime(POSTED_DATE_FORMAT)
+                day_counts = counts.setdefault(day, [0, 0])
+                day_counts[is_revision] += 1
+        path = os.path.join(self._archive_path(archive), DAILY_COUNTS_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(counts, f, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def _stored_rows(self, path):
+        try:
+            return os.path.getsize(os.path.join(path, POSTED_FILE)) // 4
+        except FileNotFoundError:
+            return 0
+
+    def daily_counts(self, archive):
+        path = os.path.join(self._archive_path(archive), DAILY_COUNTS_FILE)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def archives(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def load(self, archive, start=None, end=None):
+        """Load the (posted, is_revision, is_duplicate) columns of an archive.
+
+        Only the monthly partitions overlapping `start` to `end`, both dates and
+        inclusive, are read, but rows outside the range are not filtered out. Rows
+        of partitions written before the duplicate column existed are not flagged.
+        """
+        posted, flags, duplicates = array("i"), array("B"), array("B")
+        partitions = self._partitions(archive)
+        if start is not None or end is not None:
+            first = start or datetime.date.fromordinal(1)
+            last = end or datetime.date.today()
+            wanted = set(_partition_months(first, last))
+            partitions = [partition for partition in partitions if partition in wanted]
+        for partition in partitions:
+            path = os.path.join(self._archive_path(archive), partition)
+            with open(os.path.join(path, POSTED_FILE), "rb") as f:
+                posted.frombytes(f.read())
+            with open(os.path.join(path, IS_REVISION_FILE), "rb") as f:
+                flags.frombytes(f.read())
+            try:
+                with open(os.path.join(path, IS_DUPLICATE_FILE), "rb") as f:
+                    duplicates.frombytes(f.read())
+            except FileNotFoundError:
+                pass
+            duplicates.extend(bytes(len(posted) - len(duplicates)))
+        return _to_little_endian(posted), flags, duplicates
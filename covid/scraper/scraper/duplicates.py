@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# An index of near-duplicate titles across the archives. The same work is often
+# posted to more than one of them, under a different id on each, so the pipeline
+# tags every article with a cluster id: the id of the first article indexed with a
+# near-identical title on another archive, or else the article's own id.
+#
+# Titles are compared by MinHash signature, an estimate of the Jaccard similarity of
+# their character shingles, and candidates are found by locality sensitive hashing:
+# the signature is cut into bands, and articles sharing any band's bucket are
+# compared. Only the few articles in an article's buckets are compared, never all of
+# them, so the cost per article does not grow with the index.
+
+import re
+import sqlite3
+
+import numpy as np
+
+from scraper.utils import data_file_path
+
+# Signatures are stored, so these must not change once an index is built
+SHINGLE_SIZE = 5
+BANDS = 16
+ROWS = 4
+PERMUTATIONS = BANDS * ROWS
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Random multipliers, with a fixed seed. A shingle's 32 bit hash x is a weighted
+# sum of its code points, and each permutation is a multiply-shift hash function,
+# the high 32 bits of (a * x + b) mod 2**64.
+_random = np.random.RandomState(20200101)
+SHINGLE_WEIGHTS = _random.randint(1, 1 << 32, SHINGLE_SIZE, dtype=np.uint64) | 1
+PERMUTATION_A = _random.randint(1, 1 << 64, PERMUTATIONS, dtype=np.uint64)[:, None]
+PERMUTATION_B = _random.randint(0, 1 << 64, PERMUTATIONS, dtype=np.uint64)[:, None]
+BAND_WEIGHTS = _random.randint(1, 1 << 63, ROWS, dtype=np.uint64) | 1
+BAND_SALTS = _random.randint(0, 1 << 63, BANDS, dtype=np.uint64)
+
+NON_WORD = re.compile(r"[\W_]+")
+
+
+def shingle_hashes(title):
+    """The distinct 32 bit hashes of a normalised title's character shingles."""
+    text = NON_WORD.sub(" ", title.lower()).strip()
+    # Padded, so a title shorter than a shingle still has one
+    text = text.ljust(SHINGLE_SIZE)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    count = len(codes) - SHINGLE_SIZE + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset, weight in enumerate(SHINGLE_WEIGHTS):
+        hashes += codes[offset : offset + count] * weight
+    return np.unique(hashes & MAX_HASH)
+
+
+def minhash(title):
+    """The MinHash signature of a title, as PERMUTATIONS little-endian uint32 values."""
+    permuted = (PERMUTATION_A * shingle_hashes(title) + PERMUTATION_B) >> np.uint64(32)
+    return permuted.min(axis=1).astype("<u4")
+
+
+def band_keys(signature):
+    # One signed 64 bit key, as SQLite stores integers, per band of the signature.
+    # The arithmetic wraps around modulo 2**64.
+    rows = signature.astype(np.uint64).reshape(BANDS, ROWS)
+    with np.errstate(over="ignore"):
+        keys = (rows * BAND_WEIGHTS).sum(axis=1, dtype=np.uint64) + BAND_SALTS
+    return keys.view(np.int64).tolist()
+
+
+def similarity(signature, other):
+    return np.count_nonzero(signature == other) / PERMUTATIONS
+
+
+def _id_prefix(article_id):
+    return article_id.partition("_")[0]
+
+
+class DuplicateIndex:
+    """Article `id` to cluster id, with the LSH buckets of their title signatures.
+
+    An article joins the cluster of the most similar candidate whose estimated
+    similarity reaches `threshold`, unless that cluster already has an article
+    from the same archive: similar titles on one archive are different works. An indexed
+    article keeps its cluster, even if its title is revised. Each new article is
+    clustered and indexed in one short write transaction, so crawlers in other
+    processes sharing the index, see scraper/run.py, never wait on one for long.
+
+    `from_settings` shares one open index per path, between all the crawlers run in
+    one process. It is closed when the last of them closes it.
+    """
+
+    # Path to the index opened by `from_settings`
+    _open = {}
+
+    def __init__(self, path, threshold):
+        self.path = path
+        self.threshold = threshold
+        self.users = 1
+        # Autocommit, transactions are opened explicitly where they are needed
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS articles "
+            "(id TEXT PRIMARY KEY, cluster TEXT, signature BLOB)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS articles_by_cluster ON articles (cluster, id)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key INTEGER, id TEXT)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS buckets_by_key ON buckets (key)"
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        path = data_file_path(settings.get("DUPLICATE_INDEX_PATH"))
+        index = cls._open.get(path)
+        if index is not None:
+            index.users += 1
+            return index
+        index = cls._open[path] = cls(
+            path,
+            threshold=settings.getfloat("DUPLICATE_INDEX_THRESHOLD"),
+        )
+        return index
+
+    def cluster(self, article_id, title):
+        # Returns the article's cluster id, indexing the article if it is new
+        cluster = self._stored_cluster(article_id)
+        if cluster is not None:
+            return cluster
+        # Another process may index the article, or a near-duplicate, meanwhile, so
+        # the candidates are read again within the write transaction
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            cluster = self._stored_cluster(article_id)
+            if cluster is None:
+                cluster = self._index(article_id, title)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return cluster
+
+    def _stored_cluster(self, article_id):
+        row = self.connection.execute(
+            "SELECT cluster FROM articles WHERE id = ?", (article_id,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _index(self, article_id, title):
+        if not title:
+            self._add(article_id, article_id, None, [])
+            return article_id
+
+        signature = minhash(title)
+        keys = band_keys(signature)
+        candidates = self.connection.execute(
+            "SELECT DISTINCT articles.id, articles.cluster, articles.signature "
+            "FROM buckets JOIN articles ON articles.id = buckets.id "
+            f"WHERE buckets.key IN ({', '.join('?' * len(keys))})",
+            keys,
+        ).fetchall()
+        prefix = _id_prefix(article_id)
+        matches = []
+        for candidate_id, candidate_cluster, candidate_signature in candidates:
+            if _id_prefix(candidate_id) == prefix:
+                continue
+            score = similarity(
+                signature, np.frombuffer(candidate_signature, dtype="<u4")
+            )
+            if score >= self.threshold:
+                matches.append((score, candidate_cluster))
+        cluster = article_id
+        for _score, candidate_cluster in sorted(matches, reverse=True):
+            if not self._has_member(candidate_cluster, prefix):
+                cluster = candidate_cluster
+                break
+        self._add(article_id, cluster, signature.tobytes(), keys)
+        return cluster
+
+    def _has_member(self, cluster, prefix):
+        # Whether the cluster has an article from the archive with this id prefix,
+        # "`" being the character after "_"
+        row = self.connection.execute(
+            "SELECT 1 FROM articles WHERE cluster = ? AND id >= ? AND id < ? LIMIT 1",
+            (cluster, prefix + "_", prefix + "`"),
+        ).fetchone()
+        return row is not None
+
+    def _add(self, article_id, cluster, signature, keys):
+        self.connection.execute(
+            "INSERT INTO articles VALUES (?, ?, ?)", (article_id, cluster, signature)
+        )
+        self.connection.executemany(
+            "INSERT INTO buckets VALUES (?, ?)", [(key, article_id) for key in keys]
+        )
+
+    def close(self):
+        self.users -= 1
+        if self.users == 0:
+            if self._open.get(self.path) is self:
+                del self._open[self.path]
+            self.connection.close()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+# A crawl frontier shared by several processes, or machines with a shared disk,
+# through a SQLite file. One leader per spider follows the listing pages, and owns
+# their cursor, while any number of workers lease the follow-up jobs it queues:
+# article pages and Crossref lookups.
+#
+#     scrapy crawl chinaxiv -a role=leader
+#     scrapy crawl chinaxiv -a role=worker     # as many as you like
+#
+# A leader saves its paging cursor as it goes, so a leader restarted after a crash
+# carries on from the page it had reached. The cursor is cleared once paging is done.
+#
+# A leased job that is not completed in time, e.g. its worker died, is leased again,
+# up to FRONTIER_MAX_ATTEMPTS times, and then given up as failed. A request is only
+# dropped as a duplicate of a job that is queued or leased, so one that is done or
+# failed is queued again by a later run.
+
+import os
+import time
+import pickle
+import socket
+import sqlite3
+
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import Request
+from scrapy.utils.request import request_from_dict
+
+from scraper.utils import data_file_path
+
+
+class Frontier:
+    def __init__(self, path, lease_seconds, max_attempts):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit, transactions are opened explicitly where they are needed
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, spider TEXT, fingerprint TEXT, "
+            "request BLOB, state TEXT, owner TEXT, expires REAL, attempts INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (spider, state, id)"
+        )
+        self.connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS live_jobs_by_fingerprint "
+            "ON jobs (spider, fingerprint) WHERE state IN ('queued', 'leased')"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS leaders ("
+            "spider TEXT PRIMARY KEY, owner TEXT, expires REAL, cursor TEXT)"
+        )
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            data_file_path(settings.get("FRONTIER_PATH")),
+            lease_seconds=settings.getfloat("FRONTIER_LEASE_SECONDS"),
+            max_attempts=settings.getint("FRONTIER_MAX_ATTEMPTS"),
+        )
+
+    def enqueue(self, spider_name, fingerprint, request_dict):
+        # Returns False for a request that is queued, or leased, already
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO jobs VALUES (NULL, ?, ?, ?, 'queued', NULL, 0, 0)",
+            (spider_name, fingerprint, pickle.dumps(request_dict)),
+        )
+        return cursor.rowcount == 1
+
+    def lease(self, spider_name, owner, limit):
+        # Returns [(job id, request dict)], queued jobs and expired leases first come
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.connection.execute(
+                "SELECT id, request FROM jobs WHERE spider = ? AND attempts < ? AND "
+                "(state = 'queued' OR (state = 'leased' AND expires < ?)) "
+                "ORDER BY id LIMIT ?",
+                (spider_name, self.max_attempts, now, limit),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE jobs SET state = 'leased', owner = ?, expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                [(owner, now + self.lease_seconds, job_id) for job_id, _ in rows],
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return [(job_id, pickle.loads(request)) for job_id, request in rows]
+
+    def fail_exhausted(self, spider_name):
+        # Gives up the expired leases that have no attempts left, returns how many
+        cursor = self.connection.execute(
+            "UPDATE jobs SET state = 'failed', request = NULL WHERE spider = ? AND "
+            "state = 'leased' AND attempts >= ? AND expires < ?",
+            (spider_name, self.max_attempts, time.time()),
+        )
+        return cursor.rowcount
+
+    def complete(self, job_id):
+        self.connection.execute(
+            "UPDATE jobs SET state = 'done', request = NULL WHERE id = ?", (job_id,)
+        )
+
+    def pending(self, spider_name):
+        # Jobs that are, or may again be, waiting for a worker
+        (count,) = self.connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE spider = ? AND attempts < ? AND "
+            "state IN ('queued', 'leased')",
+            (spider_name, self.max_attempts),
+        ).fetchone()
+        return count
+
+    def claim_leader(self, spider_name, owner):
+        # Take, or renew, leadership of a spider, False while another leader holds it
+        now = time.time()
+        cursor = self.connection.execute(
+            "INSERT INTO leaders VALUES (?, ?, ?, NULL) ON CONFLICT (spider) DO UPDATE "
+            "SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leaders.owner = excluded.owner OR leaders.expires < ?",
+            (spider_name, owner, now + self.lease_seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def has_leader(self, spider_name):
+        row = self.connection.execute(
+            "SELECT expires FROM leaders WHERE spider = ?", (spider_name,)
+        ).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def release_leader(self, spider_name, owner):
+        # The jobs that are over are of no more use once the leader is done
+        self.connection.execute(
+            "UPDATE leaders SET expires = 0 WHERE spider = ? AND owner = ?",
+            (spider_name, owner),
+        )
+        self.connection.execute(
+            "DELETE FROM jobs WHERE spider = ? AND state IN ('done', 'failed')",
+            (spider_name,),
+        )
+
+    def save_cursor(self, spider_name, owner, cursor):
+        self.connection.execute(
+            "UPDATE leaders SET cursor = ? WHERE spider = ? AND owner = ?",
+            (cursor, spider_name, owner),
+        )
+
+    def get_cursor(self, spider_name):
+        row = self.connection.execute(
+            "SELECT cursor FROM leaders WHERE spider = ?", (spider_name,)
+        ).fetchone()
+        return row and row[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class FrontierMixin:
+    # "standalone" crawls on its own, as before. A "leader" crawls the listing pages
+    # and queues the requests for `frontier_callbacks` in the frontier, for the
+    # "worker"s to lease. Set with `scrapy crawl <name> -a role=worker`.
+    role = "standalone"
+    frontier = None
+    frontier_callbacks = ()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.role not in ("standalone", "leader", "worker"):
+            raise ValueError(f"Unknown role: {spider.role}")
+        if spider.role != "standalone":
+            spider.frontier = Frontier.from_settings(crawler.settings)
+            spider.frontier_owner = f"{socket.gethostname()}:{os.getpid()}"
+            spider.frontier_lease_batch = crawler.settings.getint(
+                "FRONTIER_LEASE_BATCH"
+            )
+            crawler.signals.connect(spider._frontier_idle, signal=signals.spider_idle)
+            crawler.signals.connect(
+                spider._close_frontier, signal=signals.spider_closed
+            )
+        return spider
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        # Workers start from the frontier, the others from `start_urls`
+        if self.role == "worker":
+            return self._lease_requests()
+        if self.role == "leader":
+            if not self._claim_leadership():
+                raise RuntimeError(f"{self.name} already has a leader")
+            request = self._resume_request()
+            if request is not None:
+                return [request]
+        return self._initial_requests()
+
+    def _initial_requests(self):
+        # Listing pages, see BookmarkMixin.listing_failed
+        return [
+            Request(url, dont_filter=True, errback=self.listing_failed)
+            for url in self.start_urls
+        ]
+
+    def _resume_request(self):
+        # The listing page of the cursor saved by a leader that stopped part way
+        cursor = self.frontier.get_cursor(self.name)
+        url = self._cursor_url(cursor) if cursor else None
+        if url is None:
+            return None
+        self.logger.info(f"Resuming from the frontier's cursor: {cursor}")
+        return Request(url, dont_filter=True, errback=self.listing_failed)
+
+    def _cursor_url(self, cursor):
+        # A spider whose listing pages have a cursor maps it to the page's URL
+        return None
+
+    def _save_bookmark(self, spider, reason):
+        # Workers do not page, their leader moves the bookmark
+        if self.role != "worker":
+            super()._save_bookmark(spider, reason)
+
+    def _claim_leadership(self):
+        return self.frontier.claim_leader(self.name, self.frontier_owner)
+
+    def _save_frontier_cursor(self, cursor):
+        # Leaders record their pagination cursor, and renew their leadership with it
+        if self.role == "leader":
+            self._claim_leadership()
+            self.frontier.save_cursor(self.name, self.frontier_owner, cursor)
+
+    def _is_frontier_request(self, request):
+        callback = getattr(request.callback, "__name__", None)
+        return self.role == "leader" and callback in self.frontier_callbacks
+
+    def _lease_requests(self):
+        exhausted = self.frontier.fail_exhausted(self.name)
+        if exhausted:
+            self.crawler.stats.inc_value("frontier/exhausted", exhausted)
+            self.logger.warning(
+                f"Gave up {exhausted} jobs after {self.frontier.max_attempts} attempts"
+            )
+        jobs = self.frontier.lease(
+            self.name, self.frontier_owner, self.frontier_lease_batch
+        )
+        self.crawler.stats.inc_value("frontier/leased", len(jobs))
+        requests = []
+        for job_id, request_dict in jobs:
+            # A job leased again must not be dropped as a duplicate
+            request = request_from_dict(request_dict, spider=self)
+            request.meta["frontier_job"] = job_id
+            request.dont_filter = True
+            requests.append(request)
+        return requests
+
+    def _frontier_idle(self, spider):
+        if self.role == "leader":
+            return
+        requests = self._lease_requests()
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        # Wait on jobs leased by others, which may expire, and on a live leader
+        if (
+            requests
+            or self.frontier.pending(self.name)
+            or self.frontier.has_leader(self.name)
+        ):
+            raise DontCloseSpider
+
+    def _close_frontier(self, spider):
+        if self.role == "leader":
+            if self.paging_complete:
+                self.frontier.save_cursor(self.name, self.frontier_owner, None)
+            self.frontier.release_leader(self.name, self.frontier_owner)
+        self.frontier.close()
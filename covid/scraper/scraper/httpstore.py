@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# A compressed, content-addressed store of downloaded responses, used by
+# ScraperDownloaderMiddleware to revalidate pages instead of downloading them again.
+#
+#     <dir>/index.sqlite                  request fingerprint -> response metadata
+#     <dir>/bodies/<ab>/<sha256>.z        zlib compressed bodies, keyed by content
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+COMPRESSION_LEVEL = 6
+
+
+class CachedResponse:
+    """Metadata of a stored response, its body is read on demand."""
+
+    __slots__ = ("url", "status", "headers", "body_hash", "etag", "last_modified")
+
+    def __init__(self, url, status, headers, body_hash, etag, last_modified):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body_hash = body_hash
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "fingerprint TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, "
+            "body_hash TEXT, etag TEXT, last_modified TEXT, stored_at REAL)"
+        )
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.directory, "bodies", body_hash[:2], body_hash + ".z")
+
+    def get(self, fingerprint):
+        row = self.connection.execute(
+            "SELECT url, status, headers, body_hash, etag, last_modified "
+            "FROM responses WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body_hash, etag, last_modified = row
+        return CachedResponse(
+            url, status, json.loads(headers), body_hash, etag, last_modified
+        )
+
+    def put(self, fingerprint, response):
+        # Returns the number of compressed bytes written, 0 if the body was stored
+        # already, under another request or an earlier download
+        body_hash = hashlib.sha256(response.body).hexdigest()
+        path = self._body_path(body_hash)
+        written = 0
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(response.body, COMPRESSION_LEVEL)
+            with open(path + ".tmp", "wb") as f:
+                f.write(compressed)
+            os.replace(path + ".tmp", path)
+            written = len(compressed)
+        headers = {
+            key.decode("latin-1"): [value.decode("latin-1") for value in values]
+            for key, values in response.headers.items()
+        }
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    fingerprint,
+                    response.url,
+                    response.status,
+                    json.dumps(headers),
+                    body_hash,
+                    etag.decode("latin-1") if etag else None,
+                    last_modified.decode("latin-1") if last_modified else None,
+                    time.time(),
+                ),
+            )
+        return written
+
+    def touch(self, fingerprint):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ? WHERE fingerprint = ?",
+                (time.time(), fingerprint),
+            )
+
+    def build_response(self, cached, request):
+        try:
+            with open(self._body_path(cached.body_hash), "rb") as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+        headers = Headers(cached.headers)
+        response_cls = responsetypes.from_args(
+            headers=headers, url=cached.url, body=body
+        )
+        return response_cls(
+            cached.url,
+            status=cached.status,
+            headers=headers,
+            body=body,
+            flags=["cached"],
+            request=request,
+        )
+
+    def close(self):
+        self.connection.close()
@@ -5,10 +5,122 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
-import scrapy
+import datetime
 
+from types import MappingProxyType
+from itemadapter import ItemAdapter
+from itemadapter.adapter import AdapterInterface
 
-class ScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+POSTED_DATE_FORMAT = "%Y-%m-%d"
+
+
+def serialize_posted(ordinal):
+    return datetime.date.fromordinal(ordinal).strftime(POSTED_DATE_FORMAT)
+
+
+class ArticleItem:
+    """An article scraped from any of the archives.
+
+    Slotted, rather than a dict, because many thousands of these wait in the
+    scheduler's `cb_kwargs` during a backfill. `posted` is a proleptic Gregorian
+    ordinal, see `datetime.date.toordinal`, and exported as a "%Y-%m-%d" string.
+    A field that is None has not been scraped (yet). `cluster` is the id of the
+    article's cluster of near-duplicates across the archives, set by the pipeline.
+
+    `fingerprint` is not a field, and is not exported. An archive whose article URLs
+    do not change between versions sets it, so the seen index can tell a revised
+    article from the one it stored, see scraper/seen.py.
+    """
+
+    field_names = ("id", "title", "url", "doi", "posted", "is_revision", "cluster")
+    __slots__ = field_names + ("fingerprint",)
+
+    # Field metadata, as used by Scrapy's item exporters
+    fields = {
+        "posted": MappingProxyType({"serializer": serialize_posted}),
+    }
+
+    def __init__(
+        self,
+        id=None,
+        title=None,
+        url=None,
+        doi=None,
+        posted=None,
+        is_revision=None,
+        cluster=None,
+        fingerprint=None,
+    ):
+        self.id = id
+        self.title = title
+        self.url = url
+        self.doi = doi
+        self.posted = posted
+        self.is_revision = is_revision
+        self.cluster = cluster
+        self.fingerprint = fingerprint
+
+    @property
+    def posted_date(self):
+        return None if self.posted is None else datetime.date.fromordinal(self.posted)
+
+    def set_posted_date(self, date):
+        self.posted = date.toordinal()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class ArticleItemAdapter(AdapterInterface):
+    """Lets Scrapy, and `ItemAdapter`, treat `ArticleItem` as an item.
+
+    Only the fields that have been set, i.e. are not None, are present, so exported
+    articles look just like the dicts the spiders used to emit.
+    """
+
+    @classmethod
+    def is_item_class(cls, item_class):
+        return issubclass(item_class, ArticleItem)
+
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return list(item_class.field_names)
+
+    @classmethod
+    def get_field_meta_from_class(cls, item_class, field_name):
+        return item_class.fields.get(field_name, MappingProxyType({}))
+
+    def get_field_meta(self, field_name):
+        return self.get_field_meta_from_class(self.item.__class__, field_name)
+
+    def __getitem__(self, field_name):
+        if field_name in self.item.field_names:
+            value = getattr(self.item, field_name)
+            if value is not None:
+                return value
+        raise KeyError(field_name)
+
+    def __setitem__(self, field_name, value):
+        if field_name not in self.item.field_names:
+            raise KeyError(
+                f"{self.item.__class__.__name__} does not support field: {field_name}"
+            )
+        setattr(self.item, field_name, value)
+
+    def __delitem__(self, field_name):
+        self[field_name]
+        setattr(self.item, field_name, None)
+
+    def __iter__(self):
+        return (
+            name
+            for name in self.item.field_names
+            if getattr(self.item, name) is not None
+        )
+
+    def __len__(self):
+        return sum(1 for _name in self)
+
+
+ItemAdapter.ADAPTER_CLASSES.appendleft(ArticleItemAdapter)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Incremental decoding of a top level JSON object, so a spider can work through a
+# large array member one element at a time and stop as soon as it has what it needs.
+
+import re
+import json
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def _skip(text, index):
+    return _whitespace.match(text, index).end()
+
+
+def _expect(text, index, char):
+    index = _skip(text, index)
+    if text[index : index + 1] != char:
+        raise ValueError(f"Expecting {char!r} at char {index}")
+    return index + 1
+
+
+class LazyArray:
+    """Iterator over the elements of a JSON array, decoding each one on demand."""
+
+    def __init__(self, text, index):
+        self.text = text
+        self.index = _expect(text, index, "[")
+        self.first = True
+        self.done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done:
+            raise StopIteration
+        index = _skip(self.text, self.index)
+        if self.text[index : index + 1] == "]":
+            self.index = index + 1
+            self.done = True
+            raise StopIteration
+        if not self.first:
+            index = _skip(self.text, _expect(self.text, index, ","))
+        self.first = False
+        value, self.index = _decoder.raw_decode(self.text, index)
+        return value
+
+    def end(self):
+        # Decode, and discard, whatever the consumer left unread. The rest is decoded
+        # as one array by the C decoder, a call per element would be slower than
+        # `json.loads` of the whole text.
+        if self.done:
+            return self.index
+        index = _skip(self.text, self.index)
+        if not self.first and self.text[index : index + 1] == ",":
+            index += 1
+        rest = "[" + self.text[index:]
+        _values, end = _decoder.raw_decode(rest)
+        self.index = index + end - 1
+        self.done = True
+        return self.index
+
+
+def iter_members(text, lazy_keys=()):
+    """Yield the (key, value) members of the top level object in `text`.
+
+    Array members named in `lazy_keys` are yielded as a `LazyArray`, and only the
+    elements the caller iterates over are decoded. A consumer that stops early can
+    simply stop iterating.
+    """
+    index = _expect(text, 0, "{")
+    index = _skip(text, index)
+    if text[index : index + 1] == "}":
+        return
+    while True:
+        key, index = _decoder.raw_decode(text, _skip(text, index))
+        index = _skip(text, _expect(text, index, ":"))
+        if key in lazy_keys and text[index : index + 1] == "[":
+            array = LazyArray(text, index)
+            yield key, array
+            index = array.end()
+        else:
+            value, index = _decoder.raw_decode(text, index)
+            yield key, value
+        index = _skip(text, index)
+        if text[index : index + 1] == "}":
+            return
+        index = _expect(text, index, ",")
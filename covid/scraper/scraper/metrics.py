@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Counters and latency histograms for the hot paths of a crawl, collected by
+# ScraperSpiderMiddleware and exported as JSON and as a Prometheus textfile, see
+# https://github.com/prometheus/node_exporter#textfile-collector
+
+import math
+import time
+import bisect
+
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, math.inf)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Named counters, gauges and histograms, each keyed by a sorted label tuple."""
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def to_dict(self):
+        def flat(name, labels):
+            if not labels:
+                return name
+            return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+        return {
+            "labels": self.labels,
+            "updated": time.time(),
+            "counters": {flat(*key): v for key, v in sorted(self.counters.items())},
+            "gauges": {flat(*key): v for key, v in sorted(self.gauges.items())},
+            "histograms": {
+                flat(*key): {
+                    "count": h.count,
+                    "sum": h.sum,
+                    "mean": h.sum / h.count if h.count else None,
+                    "buckets": {str(bound): total for bound, total in h.cumulative()},
+                }
+                for key, h in sorted(self.histograms.items())
+            },
+        }
+
+    def to_prometheus(self, prefix="scraper"):
+        def labels(extra=()):
+            pairs = list(self.labels.items()) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+            for name in sorted({name for name, _labels in series}):
+                lines.append(f"# TYPE {prefix}_{name} {kind}")
+                for (series_name, extra), value in sorted(series.items()):
+                    if series_name == name:
+                        lines.append(f"{prefix}_{name}{labels(extra)} {value}")
+        for name in sorted({name for name, _labels in self.histograms}):
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for (series_name, extra), h in sorted(self.histograms.items()):
+                if series_name != name:
+                    continue
+                for bound, total in h.cumulative():
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    bucket_labels = labels(extra + (("le", le),))
+                    lines.append(f"{prefix}_{name}_bucket{bucket_labels} {total}")
+                lines.append(f"{prefix}_{name}_sum{labels(extra)} {h.sum}")
+                lines.append(f"{prefix}_{name}_count{labels(extra)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, elapsed, **self.labels)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_no_timer = _NoTimer()
+
+
+def time_selector(spider, selector):
+    # Times a block of selector/XPath work of a spider, if its crawl is instrumented
+    metrics = getattr(spider, "metrics", None)
+    if metrics is None:
+        return _no_timer
+    return _Timer(metrics, "selector_seconds", {"selector": selector})
@@ -5,99 +5,453 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+import json
+import time
+import weakref
+import email.utils
+from collections import defaultdict
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request, TextResponse
+from scrapy.utils.project import data_path
+from twisted.internet import task
+
+from scraper.httpstore import ResponseStore
+from scraper.metrics import Metrics
+from scraper.parsing import EXTRACTED_META, ParserPool
 
 
 class ScraperSpiderMiddleware(object):
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    # Instruments the spiders, see scraper/metrics.py. For every response it times
+    # the callback and counts the items and follow-up requests it returns, along with
+    # the response's download latency, by callback, so Crossref lookups show up as
+    # `parse_crossref`. The spiders add their selector/XPath timings themselves. The
+    # requests waiting with `cb_kwargs` are tracked by reference, so the payload
+    # count drops as soon as Scrapy is done with them.
+    #
+    # Everything is written every METRICS_EXPORT_INTERVAL seconds, and at the end of
+    # the crawl, to <METRICS_DIR>/<spider>.json and <spider>.prom.
+
+    def __init__(self, directory, interval, stats):
+        self.directory = directory
+        self.interval = interval
+        self.stats = stats
+        self.metrics = None
+        self.waiting = weakref.WeakSet()
+        self.export_loop = None
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        settings = crawler.settings
+        directory = data_path(settings.get("METRICS_DIR"), createdir=True)
+        s = cls(directory, settings.getfloat("METRICS_EXPORT_INTERVAL"), crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.request_scheduled, signal=signals.request_scheduled)
         return s
 
-    def process_spider_input(self, response, spider):
-        # Called for each response that goes through the spider
-        # middleware and into the spider.
-
-        # Should return None or raise an exception.
-        return None
-
     def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
+        # Time only the callback's own work, not whatever consumes its output
+        callback = self._observe_response(response)
+        elapsed = 0.0
+        items = requests = 0
+        outputs = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                output = next(outputs)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            if isinstance(output, Request):
+                requests += 1
+            else:
+                items += 1
+            yield output
+        self._observe_callback(callback, elapsed, items, requests)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # The same for asynchronous output, e.g. the start requests
+        callback = self._observe_response(response)
+        elapsed = 0.0
+        items = requests = 0
+        outputs = result.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                output = await outputs.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            if isinstance(output, Request):
+                requests += 1
+            else:
+                items += 1
+            yield output
+        self._observe_callback(callback, elapsed, items, requests)
 
-        # Must return an iterable of Request, dict or Item objects.
-        for i in result:
-            yield i
+    def _observe_response(self, response):
+        callback = getattr(response.request.callback, "__name__", "parse")
+        latency = response.meta.get("download_latency")
+        if latency is not None:
+            self.metrics.observe("download_latency_seconds", latency, callback=callback)
+        return callback
 
-    def process_spider_exception(self, response, exception, spider):
-        # Called when a spider or process_spider_input() method
-        # (from other spider middleware) raises an exception.
+    def _observe_callback(self, callback, elapsed, items, requests):
+        self.metrics.observe("callback_seconds", elapsed, callback=callback)
+        self.metrics.inc("callback_items_total", items, callback=callback)
+        self.metrics.inc("callback_requests_total", requests, callback=callback)
 
-        # Should return either None or an iterable of Request, dict
-        # or Item objects.
-        pass
+    def request_scheduled(self, request, spider):
+        if request.cb_kwargs:
+            self.waiting.add(request)
 
-    def process_start_requests(self, start_requests, spider):
-        # Called with the start requests of the spider, and works
-        # similarly to the process_spider_output() method, except
-        # that it doesn’t have a response associated.
+    def _cb_kwargs_payload(self):
+        # Requests still waiting, and the values they carry, a list counts its length
+        requests = list(self.waiting)
+        values = sum(
+            len(value) if isinstance(value, (list, tuple)) else 1
+            for request in requests
+            for value in request.cb_kwargs.values()
+        )
+        return len(requests), values
 
-        # Must return only requests (not items).
-        for r in start_requests:
-            yield r
+    def export(self):
+        requests, values = self._cb_kwargs_payload()
+        self.metrics.set("cb_kwargs_requests", requests)
+        self.metrics.set("cb_kwargs_values", values)
+        for key, value in self.stats.get_stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.metrics.set("stat", value, key=key)
+        name = self.metrics.labels["spider"]
+        for extension, content in (
+            (".json", json.dumps(self.metrics.to_dict(), indent=1)),
+            (".prom", self.metrics.to_prometheus()),
+        ):
+            path = os.path.join(self.directory, name + extension)
+            with open(path + ".tmp", "w") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+        self.metrics = spider.metrics = Metrics(spider=spider.name)
+        if self.interval > 0:
+            self.export_loop = task.LoopingCall(self.export)
+            self.export_loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.export_loop is not None and self.export_loop.running:
+            self.export_loop.stop()
+        self.export()
+
+
+class FrontierMiddleware(object):
+    # Between the spiders and the shared frontier, see scraper/frontier.py. A leader's
+    # requests for the spider's `frontier_callbacks` are queued in the frontier
+    # instead of being crawled, and a worker's leased job is completed once its
+    # callback has run. Leaders renew their leadership as their responses come in.
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.renewed = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_spider_output(self, response, result, spider):
+        for output in result:
+            if not self._enqueue(output, spider):
+                yield output
+        self._complete(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for output in result:
+            if not self._enqueue(output, spider):
+                yield output
+        self._complete(response, spider)
+
+    def _enqueue(self, output, spider):
+        # Returns True for a request now in the frontier's hands
+        if getattr(spider, "frontier", None) is None:
+            return False
+        if not isinstance(output, Request) or not spider._is_frontier_request(output):
+            return False
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(output).hex()
+        request_dict = output.to_dict(spider=spider)
+        if spider.frontier.enqueue(spider.name, fingerprint, request_dict):
+            self.stats.inc_value("frontier/enqueued")
+        else:
+            # Queued, or being crawled, by another job already
+            self.stats.inc_value("frontier/duplicate")
+        return True
+
+    def _complete(self, response, spider):
+        if getattr(spider, "frontier", None) is None:
+            return
+        job_id = response.meta.get("frontier_job")
+        if job_id is not None:
+            spider.frontier.complete(job_id)
+            self.stats.inc_value("frontier/completed")
+        if spider.role == "leader" and time.time() - self.renewed > 60:
+            spider._claim_leadership()
+            self.renewed = time.time()
+
+
+class CheckpointMiddleware(object):
+    # Between the spiders and their checkpoint, see scraper/checkpoint.py. The
+    # requests a checkpointed spider yields are written to its checkpoint instead of
+    # being scheduled, and once a callback has run its request is marked done and the
+    # scheduler is topped up from the checkpoint. Requests yielded by an errback do
+    # not pass through spider middlewares, and so are scheduled as usual.
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls()
+
+    def process_spider_output(self, response, result, spider):
+        for output in result:
+            if not self._push(output, spider):
+                yield output
+        self._complete(response, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for output in result:
+            if not self._push(output, spider):
+                yield output
+        self._complete(response, spider)
+
+    def _push(self, output, spider):
+        # Returns True for a request now in the checkpoint's hands
+        if getattr(spider, "checkpoint_store", None) is None:
+            return False
+        if not isinstance(output, Request):
+            return False
+        spider._checkpoint_push(output)
+        return True
+
+    def _complete(self, response, spider):
+        if getattr(spider, "checkpoint_store", None) is None:
+            return
+        request_id = response.meta.get("checkpoint_request")
+        if request_id is not None:
+            spider._checkpoint_complete(request_id)
+        spider._checkpoint_feed()
 
 
 class ScraperDownloaderMiddleware(object):
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    # A conditional HTTP cache over the response store, see scraper/httpstore.py.
+    #
+    # Requests with `meta["cache_immutable"]`, e.g. a versioned article page, are
+    # answered from the store without touching the network once stored. Any other
+    # stored request is sent with If-None-Match/If-Modified-Since, and a 304 is
+    # answered with the stored response. Should the stored body be gone, the request
+    # is sent again without them. `meta["dont_cache"]` bypasses the store.
+
+    def __init__(self, store, crawler):
+        self.store = store
+        self.crawler = crawler
+        self.stats = crawler.stats
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        directory = data_path(crawler.settings.get("HTTP_STORE_DIR"), createdir=True)
+        s = cls(ResponseStore(directory), crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
+    def _fingerprint(self, request):
+        return self.crawler.request_fingerprinter.fingerprint(request).hex()
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if request.meta.get("dont_cache") or request.meta.get("httpstore_refetch"):
+            return None
+        cached = self.store.get(self._fingerprint(request))
+        if cached is None:
+            self.stats.inc_value("httpstore/miss")
+            return None
+        if request.meta.get("cache_immutable"):
+            response = self.store.build_response(cached, request)
+            if response is not None:
+                self.stats.inc_value("httpstore/hit")
+                return response
+        if cached.etag:
+            request.headers.setdefault("If-None-Match", cached.etag)
+        if cached.last_modified:
+            request.headers.setdefault("If-Modified-Since", cached.last_modified)
+        self.stats.inc_value("httpstore/revalidate")
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if request.meta.get("dont_cache") or "cached" in response.flags:
+            return response
+        fingerprint = self._fingerprint(request)
+        if response.status == 304:
+            cached = self.store.get(fingerprint)
+            cached_response = cached and self.store.build_response(cached, request)
+            if cached_response is not None:
+                self.stats.inc_value("httpstore/not_modified")
+                self.store.touch(fingerprint)
+                return cached_response
+            if not request.meta.get("httpstore_refetch"):
+                return self._refetch(request)
+        elif response.status == 200:
+            written = self.store.put(fingerprint, response)
+            self.stats.inc_value("httpstore/stored")
+            self.stats.inc_value("httpstore/stored_bytes", written)
         return response
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
-
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _refetch(self, request):
+        # A 304 without a stored body to answer it with, ask for the whole page
+        self.stats.inc_value("httpstore/refetch")
+        headers = request.headers.copy()
+        headers.pop("If-None-Match", None)
+        headers.pop("If-Modified-Since", None)
+        return request.replace(
+            headers=headers,
+            meta=dict(request.meta, httpstore_refetch=True),
+            dont_filter=True,
+        )
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+    def spider_closed(self, spider):
+        # Responses answered from the store, out of all the requests it saw
+        get = self.stats.get_value
+        answered = get("httpstore/hit", 0) + get("httpstore/not_modified", 0)
+        total = answered + get("httpstore/stored", 0)
+        if total:
+            self.stats.set_value("httpstore/hit_rate", round(answered / total, 4))
+        self.store.close()
+
+
+class AdaptiveConcurrencyMiddleware(object):
+    # Adapts each download slot's concurrency and delay to how the website copes,
+    # within the budget given to the slot in DOWNLOAD_SLOTS. A 429 or 503 halves the
+    # concurrency and doubles the delay, or waits as long as Retry-After asks, a
+    # response slower than ADAPTIVE_TARGET_LATENCY gives up one concurrent request,
+    # and every full round of fast responses wins one back and halves the delay.
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.budgets = settings.getdict("DOWNLOAD_SLOTS")
+        self.default_concurrency = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self.default_delay = settings.getfloat("DOWNLOAD_DELAY")
+        self.target_latency = settings.getfloat("ADAPTIVE_TARGET_LATENCY")
+        self.max_delay = settings.getfloat("ADAPTIVE_MAX_DELAY")
+        self.fast_responses = defaultdict(int)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        if "cached" in response.flags:
+            return response
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        slot = downloader.slots.get(key)
+        if slot is None:
+            return response
+
+        budget = self.budgets.get(key, {})
+        latency = request.meta.get("download_latency")
+        if response.status in (429, 503):
+            retry_after = self._retry_after(response)
+            slot.concurrency = max(1, slot.concurrency // 2)
+            slot.delay = min(self.max_delay, max(slot.delay * 2, 1.0, retry_after))
+            self.fast_responses[key] = 0
+            self.stats.inc_value(f"adaptive/{key}/throttled")
+        elif latency is not None and latency > self.target_latency:
+            slot.concurrency = max(1, slot.concurrency - 1)
+            self.fast_responses[key] = 0
+            self.stats.inc_value(f"adaptive/{key}/slow")
+        else:
+            self.fast_responses[key] += 1
+            if self.fast_responses[key] >= slot.concurrency:
+                self.fast_responses[key] = 0
+                ceiling = budget.get("concurrency", self.default_concurrency)
+                slot.concurrency = min(ceiling, slot.concurrency + 1)
+                slot.delay = max(
+                    budget.get("delay", self.default_delay), slot.delay / 2
+                )
+        self.stats.set_value(f"adaptive/{key}/concurrency", slot.concurrency)
+        self.stats.set_value(f"adaptive/{key}/delay", round(slot.delay, 3))
+        return response
+
+    def _retry_after(self, response):
+        # Retry-After is either a number of seconds or an HTTP date
+        value = response.headers.get("Retry-After")
+        if not value:
+            return 0.0
+        value = value.decode("latin-1").strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return max(0.0, when.timestamp() - time.time())
+
+
+class ParserPoolMiddleware(object):
+    # Parses large responses in the parser pool, off the reactor thread, see
+    # scraper/parsing.py. Only a 200 response of at least PARSER_POOL_MIN_BYTES is
+    # sent, a smaller page costs more to ship to a worker than to parse in place. If
+    # the worker fails, the callback parses the page itself. Set PARSER_POOL_WORKERS
+    # to 0 to parse everything on the reactor thread.
+
+    def __init__(self, pool, min_bytes, stats):
+        self.pool = pool
+        self.min_bytes = min_bytes
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if settings.getint("PARSER_POOL_WORKERS") <= 0:
+            raise NotConfigured
+        pool = ParserPool.from_settings(settings)
+        s = cls(pool, settings.getint("PARSER_POOL_MIN_BYTES"), crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    async def process_response(self, request, response, spider):
+        callback = getattr(request.callback, "__name__", "parse")
+        extractor = getattr(spider, "parser_pool_callbacks", {}).get(callback)
+        if (
+            extractor is None
+            or response.status != 200
+            or not isinstance(response, TextResponse)
+            or len(response.body) < self.min_bytes
+        ):
+            return response
+        start = time.perf_counter()
+        try:
+            extracted = await self.pool.run(extractor, response.body, response.encoding)
+        except Exception as error:
+            spider.logger.warning(f"Parser pool failed on {response.url}: {error!r}")
+            self.stats.inc_value("parser_pool/failed")
+            return response
+        metrics = getattr(spider, "metrics", None)
+        if metrics is not None:
+            elapsed = time.perf_counter() - start
+            metrics.observe("parser_pool_seconds", elapsed, callback=callback)
+        response.meta[EXTRACTED_META] = extracted
+        self.stats.inc_value("parser_pool/parsed")
+        return response
+
+    def spider_closed(self, spider):
+        self.pool.close()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+# Large responses, e.g. a whole OAI page or a highwire listing, are parsed by a pool
+# of worker processes, so the reactor thread keeps the downloads moving while lxml is
+# busy. ParserPoolMiddleware sends the body of a response, whose callback the spider
+# maps to an extractor in `parser_pool_callbacks`, to the pool. The plain records the
+# extractor returns reach the callback as `response.meta["extracted"]`, and a
+# callback parses the body itself when they are missing.
+#
+# An extractor is a module level function, so the workers can import it, that takes
+# the body and its encoding and returns something picklable.
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+EXTRACTED_META = "extracted"
+
+
+class ParserPool:
+    """Worker processes for the extractors, shared by all the crawlers in a process.
+
+    `from_settings` opens one pool per process, it is shut down when the last of its
+    users closes it. The workers are spawned rather than forked from the reactor.
+    """
+
+    # The pool opened by `from_settings`
+    _open = None
+
+    def __init__(self, workers):
+        self.users = 1
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(workers, mp_context=context)
+
+    @classmethod
+    def from_settings(cls, settings):
+        pool = cls._open
+        if pool is not None:
+            pool.users += 1
+            return pool
+        pool = cls._open = cls(settings.getint("PARSER_POOL_WORKERS"))
+        return pool
+
+    async def run(self, extractor, body, encoding):
+        # Needs the asyncio reactor, see TWISTED_REACTOR in settings
+        future = self.executor.submit(extractor, body, encoding)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        self.users -= 1
+        if self.users == 0:
+            if ParserPool._open is self:
+                ParserPool._open = None
+            self.executor.shutdown(wait=False)
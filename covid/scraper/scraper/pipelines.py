@@ -5,7 +5,132 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import os
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+from scrapy.utils.project import data_path
+
+from scraper.seen import SeenIndex, article_fingerprint
+from scraper.columnar import ColumnarStore
+from scraper.duplicates import DuplicateIndex
+from scraper.sink import NdjsonSink
+
 
 class ScraperPipeline(object):
+    def __init__(self, seen_index, stats):
+        self.seen_index = seen_index
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(SeenIndex.from_settings(crawler.settings), crawler.stats)
+
+    def close_spider(self, spider):
+        self.seen_index.close()
+
+    def process_item(self, item, spider):
+        # Drop articles that were already stored, unchanged, by an earlier run
+        adapter = ItemAdapter(item)
+        article_id, fingerprint = adapter["id"], article_fingerprint(item)
+        if self.seen_index.is_unchanged(article_id, fingerprint):
+            self.stats.inc_value("seen_index/dropped")
+            raise DropItem(f"Already seen: {article_id}")
+        self.seen_index.add(article_id, fingerprint)
+        return item
+
+
+class DuplicateIndexPipeline(object):
+    def __init__(self, index, stats):
+        self.index = index
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(DuplicateIndex.from_settings(crawler.settings), crawler.stats)
+
+    def close_spider(self, spider):
+        self.index.close()
+
+    def process_item(self, item, spider):
+        # Tag the article with its cluster of near-duplicates across the archives
+        adapter = ItemAdapter(item)
+        article_id = adapter["id"]
+        cluster = self.index.cluster(article_id, adapter.get("title"))
+        adapter["cluster"] = cluster
+        if cluster != article_id:
+            self.stats.inc_value("duplicates/clustered")
+        return item
+
+
+class ColumnarStorePipeline(object):
+    def __init__(self, store, batch_size, stats):
+        self.store = store
+        self.batch_size = batch_size
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        store = ColumnarStore(data_path(settings.get("COLUMNAR_STORE_DIR"), True))
+        return cls(store, settings.getint("COLUMNAR_BATCH_SIZE"), crawler.stats)
+
+    def close_spider(self, spider):
+        self.store.flush()
+
+    def process_item(self, item, spider):
+        # Partitioned by spider, so medRxiv and bioRxiv each get their own series.
+        # An article clustered with one from another archive is flagged as a
+        # duplicate, so the series can count the work once.
+        adapter = ItemAdapter(item)
+        article_id = adapter["id"]
+        appended = self.store.append(
+            spider.name,
+            article_id,
+            adapter["posted"],
+            adapter.get("is_revision", False),
+            adapter.get("cluster", article_id) != article_id,
+        )
+        self.stats.inc_value("columnar/appended" if appended else "columnar/duplicate")
+        if self.store.buffered() >= self.batch_size:
+            self.store.flush()
+        return item
+
+
+class NdjsonSinkPipeline(object):
+    def __init__(self, root, settings, stats):
+        self.root = root
+        self.segment_bytes = settings.getint("NDJSON_SINK_SEGMENT_BYTES")
+        self.fsync_batch = settings.getint("NDJSON_SINK_FSYNC_BATCH")
+        self.index_delta = settings.getint("NDJSON_SINK_INDEX_DELTA")
+        self.stats = stats
+        self.sink = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        root = data_path(settings.get("NDJSON_SINK_DIR"), True)
+        return cls(root, settings, crawler.stats)
+
+    def open_spider(self, spider):
+        # One log per spider, so spiders run side by side never share a writer
+        self.sink = NdjsonSink(
+            os.path.join(self.root, spider.name),
+            segment_bytes=self.segment_bytes,
+            fsync_batch=self.fsync_batch,
+            index_delta=self.index_delta,
+        )
+
+    def close_spider(self, spider):
+        self.sink.close()
+
     def process_item(self, item, spider):
+        # Exported like the feed exporters do, e.g. `posted` as a "%Y-%m-%d" string
+        adapter = ItemAdapter(item)
+        record = {}
+        for name, value in adapter.items():
+            serializer = adapter.get_field_meta(name).get("serializer")
+            record[name] = serializer(value) if serializer else value
+        self.sink.append(record)
+        self.stats.inc_value("ndjson_sink/appended")
         return item
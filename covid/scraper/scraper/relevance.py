@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Most recent preprints have nothing to do with COVID-19. The spiders check each
+# listed article's title, and abstract where the listing has one, against the
+# RELEVANCE_TERMS setting and drop unrelated articles before any follow-up request,
+# for a Crossref lookup or an article page, is made for them.
+#
+# The terms are compiled into one regular expression shaped like a trie of the terms,
+# so the regex engine follows a single branch at each position of the text instead of
+# trying every term in turn.
+
+import re
+
+from scrapy import signals
+
+# A hyphen in a term also matches a space, an en dash or nothing, and a space matches
+# any run of whitespace, e.g. "sars-cov-2" matches "SARS-CoV-2" and "SARS CoV 2"
+HYPHEN_PATTERN = "[-‐‑–\\s]?"
+SPACE_PATTERN = "\\s+"
+# A term must not start inside a Latin word, "ncov" should not match "uncovered"
+TERM_START = "(?<![a-z0-9])"
+
+
+def _build_trie(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term.casefold():
+            if "" in node:
+                # A shorter term already matches everything below it
+                break
+            node = node.setdefault(char, {})
+        else:
+            node.clear()
+            node[""] = {}
+    return trie
+
+
+def _trie_pattern(node):
+    alternatives = []
+    for char, child in sorted(node.items()):
+        if not char:
+            continue
+        if char == "-":
+            head = HYPHEN_PATTERN
+        elif char.isspace():
+            head = SPACE_PATTERN
+        else:
+            head = re.escape(char)
+        alternatives.append(head + _trie_pattern(child))
+    if len(alternatives) <= 1:
+        return "".join(alternatives)
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+class TermMatcher:
+    """Finds whether a text mentions any of a list of terms, case insensitive."""
+
+    def __init__(self, terms):
+        terms = [term.strip() for term in terms if term.strip()]
+        if not terms:
+            raise ValueError("No relevance terms")
+        self.terms = terms
+        pattern = TERM_START + _trie_pattern(_build_trie(terms))
+        self.regex = re.compile(pattern, re.IGNORECASE)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.getlist("RELEVANCE_TERMS"))
+
+    def matches(self, *texts):
+        return any(text and self.regex.search(text) for text in texts)
+
+
+class RelevanceMixin:
+    # "covid" keeps only the articles that mention one of RELEVANCE_TERMS, "all" keeps
+    # every article. Override with `scrapy crawl <name> -a relevance=all`.
+    relevance = "covid"
+    # Opened in `from_crawler`, a spider made without a crawler keeps everything
+    relevance_matcher = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if spider.relevance == "covid":
+            spider.relevance_matcher = TermMatcher.from_settings(crawler.settings)
+        elif spider.relevance != "all":
+            raise ValueError(f"Unknown relevance: {spider.relevance}")
+        crawler.signals.connect(
+            spider._record_relevance_stats, signal=signals.spider_closed
+        )
+        return spider
+
+    def _is_relevant(self, *texts, follow_up=False):
+        # `follow_up` tells whether the article would have needed another request
+        if self.relevance_matcher is None:
+            return True
+        stats = self.crawler.stats
+        stats.inc_value("relevance/checked")
+        if self.relevance_matcher.matches(*texts):
+            stats.inc_value("relevance/matched")
+            return True
+        stats.inc_value("relevance/skipped")
+        if follow_up:
+            stats.inc_value("relevance/requests_saved")
+        return False
+
+    def _record_relevance_stats(self, spider):
+        stats = self.crawler.stats
+        checked = stats.get_value("relevance/checked", 0)
+        if not checked:
+            return
+        skipped = stats.get_value("relevance/skipped", 0)
+        stats.set_value("relevance/skipped_share", round(skipped / checked, 4))
+        saved = stats.get_value("relevance/requests_saved", 0)
+        made = stats.get_value("downloader/request_count", 0)
+        if saved or made:
+            share = round(saved / (saved + made), 4)
+            stats.set_value("relevance/requests_saved_share", share)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Run all the archive spiders at once, in one reactor, from the scraper project
+# directory:
+#
+#     python -m scraper.run [spider ...] [-a name=value ...] [--output articles.jsonl]
+#
+# They share one process, so the seen index is opened and loaded once, and the
+# stores in .scrapy are shared. Each spider writes its own feed, the feeds are then
+# joined into one output file, and the stats of all the spiders are added up and
+# saved next to it as <output>.stats.json.
+#
+# With `--processes N` the spiders are spread over N processes instead, each with its
+# own reactor. The stores are SQLite and JSON files, so they are still shared.
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import multiprocessing
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import data_path, get_project_settings
+
+ARCHIVES = ("medrxiv", "biorxiv", "chemrxiv", "chinaxiv")
+
+
+def crawl(names, spider_args, feed_dir):
+    """Run the named spiders in one reactor, returns the stats of each of them."""
+    settings = get_project_settings()
+    feed_uri = os.path.join(feed_dir, "%(name)s.jsonl")
+    settings.set(
+        "FEEDS", {feed_uri: {"format": "jsonlines", "overwrite": True}}, "cmdline"
+    )
+    process = CrawlerProcess(settings)
+    crawlers = []
+    for name in names:
+        crawler = process.create_crawler(name)
+        crawlers.append((name, crawler))
+        process.crawl(crawler, **spider_args)
+    process.start()
+    return {name: crawler.stats.get_stats() for name, crawler in crawlers}
+
+
+def crawl_in_processes(names, spider_args, feed_dir, processes):
+    # One group of spiders per process, and one process per group, since a reactor
+    # cannot be restarted
+    groups = [names[i::processes] for i in range(processes)]
+    groups = [group for group in groups if group]
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(len(groups), maxtasksperchild=1) as pool:
+        results = pool.starmap(
+            crawl, [(group, spider_args, feed_dir) for group in groups]
+        )
+    stats = {}
+    for result in results:
+        stats.update(result)
+    return stats
+
+
+def join_feeds(names, feed_dir, output):
+    temp_path = output + ".tmp"
+    with open(temp_path, "wb") as joined:
+        for name in names:
+            path = os.path.join(feed_dir, name + ".jsonl")
+            if os.path.exists(path):
+                with open(path, "rb") as feed:
+                    shutil.copyfileobj(feed, joined)
+    os.replace(temp_path, output)
+
+
+def combine_stats(stats_by_spider):
+    total = {}
+    for stats in stats_by_spider.values():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[key] = total.get(key, 0) + value
+    return {"total": total, "spiders": stats_by_spider}
+
+
+def _spider_arg(value):
+    name, separator, argument = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {value!r}")
+    return name, argument
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the archive spiders together and join their output."
+    )
+    parser.add_argument("spiders", nargs="*", metavar="spider")
+    parser.add_argument(
+        "-a",
+        dest="spider_args",
+        action="append",
+        type=_spider_arg,
+        default=[],
+        metavar="NAME=VALUE",
+        help="spider argument, given to every spider",
+    )
+    parser.add_argument("-o", "--output", default="articles.jsonl")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="spread the spiders over processes"
+    )
+    args = parser.parse_args(argv)
+    names = args.spiders or list(ARCHIVES)
+    unknown = set(names) - set(ARCHIVES)
+    if unknown:
+        parser.error(f"unknown spiders {sorted(unknown)}, choose from {ARCHIVES}")
+
+    feed_dir = data_path("feeds", createdir=True)
+    spider_args = dict(args.spider_args)
+    if args.processes > 1:
+        stats = crawl_in_processes(names, spider_args, feed_dir, args.processes)
+    else:
+        stats = crawl(names, spider_args, feed_dir)
+
+    join_feeds(names, feed_dir, args.output)
+    combined = combine_stats(stats)
+    with open(args.output + ".stats.json", "w") as f:
+        json.dump(combined, f, indent=2, sort_keys=True, default=str)
+    total = combined["total"]
+    print(
+        f"{total.get('item_scraped_count', 0)} items from {len(names)} spiders, "
+        f"{total.get('downloader/request_count', 0)} requests, written to "
+        f"{args.output}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+# An index of the articles stored by earlier runs. Spiders check it before building
+# follow-up requests and the pipeline checks it before emitting duplicates.
+
+import math
+import sqlite3
+import hashlib
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+
+from scraper.utils import data_file_path
+
+
+class BloomFilter:
+    """Fixed size Bloom filter over strings, sized for `capacity` keys."""
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing, k positions from two 64 bit halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+def article_fingerprint(item):
+    # The article URL, which carries the version on the highwire archives, unless
+    # the spider set a `fingerprint` because its URLs do not, see ArticleItem
+    fingerprint = getattr(item, "fingerprint", None)
+    return fingerprint if fingerprint is not None else ItemAdapter(item).get("url")
+
+
+class SeenIndex:
+    """Article `id` to fingerprint store, with a Bloom filter in front of SQLite.
+
+    The fingerprint changes with each version of an article, see
+    `article_fingerprint`, so a new revision of a stored article is not mistaken
+    for a duplicate.
+    Most lookups are for unseen articles, and the Bloom filter answers those without
+    touching the disk.
+
+    `from_settings` shares one open index per path, between the spiders and the
+    pipeline, and between all the crawlers run in one process. It is closed when the
+    last of them closes it.
+    """
+
+    # Path to the index opened by `from_settings`
+    _open = {}
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        self.users = 1
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY, fingerprint TEXT)"
+        )
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM seen").fetchone()
+        self.bloom = BloomFilter(max(capacity, 2 * count), error_rate)
+        for (article_id,) in self.connection.execute("SELECT id FROM seen"):
+            self.bloom.add(article_id)
+
+    @classmethod
+    def from_settings(cls, settings):
+        path = data_file_path(settings.get("SEEN_INDEX_PATH"))
+        index = cls._open.get(path)
+        if index is not None:
+            index.users += 1
+            return index
+        index = cls._open[path] = cls(
+            path,
+            capacity=settings.getint("SEEN_INDEX_CAPACITY"),
+            error_rate=settings.getfloat("SEEN_INDEX_ERROR_RATE"),
+        )
+        return index
+
+    def is_unchanged(self, article_id, fingerprint):
+        if article_id not in self.bloom:
+            return False
+        row = self.connection.execute(
+            "SELECT fingerprint FROM seen WHERE id = ?", (article_id,)
+        ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def add(self, article_id, fingerprint):
+        self.bloom.add(article_id)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO seen VALUES (?, ?)", (article_id, fingerprint)
+            )
+
+    def close(self):
+        self.users -= 1
+        if self.users == 0:
+            if self._open.get(self.path) is self:
+                del self._open[self.path]
+            self.connection.close()
+
+
+class SeenIndexMixin:
+    # Opened in `from_crawler`, a spider made without a crawler skips nothing
+    seen_index = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.seen_index = SeenIndex.from_settings(crawler.settings)
+        crawler.signals.connect(spider._close_seen_index, signal=signals.spider_closed)
+        return spider
+
+    def _close_seen_index(self, spider):
+        self.seen_index.close()
+
+    def _is_seen(self, data):
+        if self.seen_index is None:
+            return False
+        if self.seen_index.is_unchanged(data.id, article_fingerprint(data)):
+            self.crawler.stats.inc_value("seen_index/skipped")
+            return True
+        return False
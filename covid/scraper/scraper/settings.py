@@ -32,6 +32,30 @@ ROBOTSTXT_OBEY = True
 # CONCURRENT_REQUESTS_PER_DOMAIN = 16
 # CONCURRENT_REQUESTS_PER_IP = 16
 
+# Each website has its own download slot, and so a concurrency budget of its own.
+# Crossref lookups use their own slot too (see the medRxiv/bioRxiv spiders), separate
+# from the archives. AdaptiveConcurrencyMiddleware lowers a slot's concurrency, and
+# raises its delay, when the website slows down or answers 429/503, and restores them
+# up to these budgets as it recovers.
+# See https://docs.scrapy.org/en/latest/topics/settings.html#download-slots
+DOWNLOAD_SLOTS = {
+    "api.crossref.org": {"concurrency": 2, "delay": 0.1},
+    "api.biorxiv.org": {"concurrency": 2, "delay": 0.25},
+    "www.medrxiv.org": {"concurrency": 4, "delay": 0.25},
+    "www.biorxiv.org": {"concurrency": 4, "delay": 0.25},
+    "chemrxiv.org": {"concurrency": 2, "delay": 0.5},
+    "www.chinaxiv.org": {"concurrency": 2, "delay": 1.0},
+}
+ADAPTIVE_TARGET_LATENCY = 3.0
+ADAPTIVE_MAX_DELAY = 60.0
+
+# Requests are queued per download slot, and by priority within a slot, so listing
+# pages jump ahead of the article pages queued for the same website.
+SCHEDULER_PRIORITY_QUEUE = "scrapy.pqueues.DownloaderAwarePriorityQueue"
+
+# The parser pool is awaited from asyncio, so the asyncio reactor is required
+TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
+
 # Disable cookies (enabled by default)
 # COOKIES_ENABLED = False
 
@@ -44,17 +68,117 @@ ROBOTSTXT_OBEY = True
 #   'Accept-Language': 'en',
 # }
 
+# Spiders stop paging once they reach their bookmark, the newest date seen by the
+# previous successful run less an overlap window. Use `-a bookmark=YYYY-MM-DD` to
+# override it for a backfill. Paths are relative to the project's .scrapy directory.
+BOOKMARK_STORE_PATH = "bookmarks.json"
+BOOKMARK_OVERLAP_DAYS = 2
+BOOKMARK_DEFAULT = "2020-01-01"
+
+# Posted dates of revised medRxiv/bioRxiv articles are cached between crawls, the
+# path is relative to the project's .scrapy data directory.
+POSTED_DATE_CACHE_PATH = "posted_dates.sqlite"
+POSTED_DATE_CACHE_TTL_DAYS = 365
+POSTED_DATE_CACHE_NEGATIVE_TTL_DAYS = 3
+POSTED_DATE_CACHE_MAX_ENTRIES = 500000
+
+# Articles stored by earlier runs are indexed by `id`, so spiders can skip their
+# follow-up requests and the pipeline can drop duplicates.
+SEEN_INDEX_PATH = "seen.sqlite"
+SEEN_INDEX_CAPACITY = 1000000
+SEEN_INDEX_ERROR_RATE = 0.001
+
+# Articles are kept only if their title, or abstract where the listing has one,
+# mentions one of these terms, see scraper/relevance.py. Matching is case insensitive,
+# and a hyphen also matches a space or nothing. Keep every article with
+# `-a relevance=all`.
+RELEVANCE_TERMS = [
+    "covid",
+    "sars-cov-2",
+    "2019-ncov",
+    "ncov",
+    "coronavirus",
+    "corona virus",
+    "lockdown",
+    "social distancing",
+    "新冠",
+    "冠状病毒",
+]
+
+# Articles are clustered with their near-duplicates on the other archives by title,
+# see scraper/duplicates.py, and the id of the cluster's first article is exported as
+# `cluster`. Titles join a cluster from an estimated Jaccard similarity, of their
+# character shingles, of DUPLICATE_INDEX_THRESHOLD. The path is relative to the
+# project's .scrapy data directory, and each new article is committed on its own.
+DUPLICATE_INDEX_PATH = "duplicates.sqlite"
+DUPLICATE_INDEX_THRESHOLD = 0.7
+
+# Stored articles are also appended to a columnar time-series store, partitioned by
+# spider and posted month, see scraper/columnar.py. The directory is relative to the
+# project's .scrapy data directory. Rows are buffered and written in batches.
+COLUMNAR_STORE_DIR = "timeseries"
+COLUMNAR_BATCH_SIZE = 1000
+
+# Downloaded responses are stored, compressed, by ScraperDownloaderMiddleware. The
+# directory is relative to the project's .scrapy data directory.
+HTTP_STORE_DIR = "httpstore"
+
+# Every stored article is also appended to an NDJSON log per spider, with an index
+# by `id`, see scraper/sink.py. The directory is relative to the project's .scrapy
+# data directory. Segments rotate at the size limit, writes are fsynced in batches,
+# and new index entries are merged into the index file in batches.
+NDJSON_SINK_DIR = "sink"
+NDJSON_SINK_SEGMENT_BYTES = 64 * 1024 * 1024
+NDJSON_SINK_FSYNC_BATCH = 500
+NDJSON_SINK_INDEX_DELTA = 100000
+
+# The frontier shared by a leader and its workers, see scraper/frontier.py. Use a
+# path on a disk every worker can reach. Workers lease jobs in batches, a lease that
+# is not completed in time goes back to the queue.
+FRONTIER_PATH = "frontier.sqlite"
+FRONTIER_LEASE_SECONDS = 300
+FRONTIER_LEASE_BATCH = 50
+FRONTIER_MAX_ATTEMPTS = 3
+
+# Crawls run with `-a checkpoint=on` keep their requests in a checkpoint per spider,
+# see scraper/checkpoint.py, and resume from it when restarted. The directory is
+# relative to the project's .scrapy data directory. At most this many requests are
+# held by the scheduler at once, the others wait in the checkpoint.
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_MEMORY_REQUESTS = 1000
+
+# Listing pages larger than PARSER_POOL_MIN_BYTES are parsed by a pool of worker
+# processes, off the reactor thread, see scraper/parsing.py. Set the workers to 0 to
+# parse every page on the reactor thread instead.
+PARSER_POOL_WORKERS = 4
+PARSER_POOL_MIN_BYTES = 32 * 1024
+
+# Crawl metrics are written as <spider>.json and <spider>.prom, a Prometheus
+# textfile, every interval in seconds. The directory is relative to the project's
+# .scrapy data directory, point it at the node exporter's textfile directory instead.
+METRICS_DIR = "metrics"
+METRICS_EXPORT_INTERVAL = 30
+
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    'scraper.middlewares.ScraperSpiderMiddleware': 543,
-# }
+# ScraperSpiderMiddleware instruments the callbacks. It sits closest to the spider,
+# after DepthMiddleware (900), so only the callbacks themselves are timed.
+SPIDER_MIDDLEWARES = {
+    "scraper.middlewares.CheckpointMiddleware": 930,
+    "scraper.middlewares.FrontierMiddleware": 940,
+    "scraper.middlewares.ScraperSpiderMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'scraper.middlewares.ScraperDownloaderMiddleware': 543,
-# }
+# ScraperDownloaderMiddleware is a conditional HTTP cache of compressed responses.
+# It sits after HttpCompressionMiddleware (590), so bodies are stored decoded.
+# ParserPoolMiddleware comes last, so it parses responses answered from the cache too.
+DOWNLOADER_MIDDLEWARES = {
+    "scraper.middlewares.ParserPoolMiddleware": 560,
+    "scraper.middlewares.AdaptiveConcurrencyMiddleware": 570,
+    "scraper.middlewares.ScraperDownloaderMiddleware": 580,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -64,11 +188,15 @@ ROBOTSTXT_OBEY = True
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-# ITEM_PIPELINES = {
-#    'scraper.pipelines.ScraperPipeline': 300,
-# }
-
-# Enable and configure the AutoThrottle extension (disabled by default)
+ITEM_PIPELINES = {
+    "scraper.pipelines.ScraperPipeline": 300,
+    "scraper.pipelines.DuplicateIndexPipeline": 350,
+    "scraper.pipelines.ColumnarStorePipeline": 400,
+    "scraper.pipelines.NdjsonSinkPipeline": 500,
+}
+
+# Enable and configure the AutoThrottle extension (disabled by default). Leave it
+# disabled, AdaptiveConcurrencyMiddleware manages the download slots instead.
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 # AUTOTHROTTLE_ENABLED = True
 # The initial download delay
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# A durable export of every scraped article: an append-only NDJSON log, one per
+# archive, with a sorted, memory-mapped index from article `id` to the newest line.
+#
+#     <root>/<archive>/log-000001.ndjson  NDJSON segments, rotated by size
+#     <root>/<archive>/index.bin          header, then sorted 32 byte records of
+#                                         (blake2b-128 of id, segment, offset, length)
+#
+# A revised article is simply appended again, the index then points at the new line.
+# New entries are held in memory and merged into the index file in batches, and the
+# index header records how much of the log it covers, so opening the sink replays
+# only the tail of the log written since the last merge.
+#
+# Look up a single preprint from the scraper project directory with:
+#
+#     python -m scraper.sink medrxiv_2020.03.10.20033001
+
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import argparse
+
+SEGMENT_NAME = "log-{:06d}.ndjson"
+INDEX_NAME = "index.bin"
+
+INDEX_MAGIC = b"NDXI"
+INDEX_HEADER = struct.Struct("<4sIQIQ4x")  # magic, version, count, segment, offset
+INDEX_RECORD = struct.Struct("<16sIQI")  # key, segment, offset, length
+INDEX_VERSION = 1
+KEY_SIZE = 16
+
+
+def id_key(article_id):
+    return hashlib.blake2b(article_id.encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+class NdjsonSink:
+    """Append-only NDJSON log of one archive, with O(log n) lookups by `id`."""
+
+    def __init__(self, directory, segment_bytes, fsync_batch, index_delta):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.index_delta = index_delta
+        os.makedirs(directory, exist_ok=True)
+
+        self.index_file = None
+        self.index = None
+        self.count = 0
+        self.delta = {}  # key -> (segment, offset, length), newer than the index file
+        self.unsynced = 0
+        covered_segment, covered_offset = self._open_index()
+
+        segments = self._segments()
+        self._replay(covered_segment, covered_offset, segments)
+        self.segment = segments[-1] if segments else 1
+        self.log = open(self._segment_path(self.segment), "ab")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_NAME.format(segment))
+
+    def _segments(self):
+        return sorted(
+            int(name[4:10])
+            for name in os.listdir(self.directory)
+            if name.startswith("log-") and name.endswith(".ndjson")
+        )
+
+    def _open_index(self):
+        # Returns the log position covered by the index file, (1, 0) without one
+        path = os.path.join(self.directory, INDEX_NAME)
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+        self.index = None
+        self.count = 0
+        if not os.path.exists(path) or os.path.getsize(path) <= INDEX_HEADER.size:
+            return 1, 0
+        self.index_file = open(path, "rb")
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, segment, offset = INDEX_HEADER.unpack_from(self.index)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"Not an NDJSON sink index: {path}")
+        self.count = count
+        return segment, offset
+
+    def _replay(self, segment, offset, segments):
+        # Index the lines appended after the index file was last written, and cut
+        # off a line left half written by a crash
+        for replayed in segments:
+            if replayed < segment:
+                continue
+            path = self._segment_path(replayed)
+            with open(path, "rb") as f:
+                f.seek(offset if replayed == segment else 0)
+                position = f.tell()
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    article_id = json.loads(line)["id"]
+                    self.delta[id_key(article_id)] = (replayed, position, len(line))
+                    position += len(line)
+            if position < os.path.getsize(path):
+                os.truncate(path, position)
+
+    def _search(self, key):
+        # Binary search of the memory-mapped index file
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = INDEX_HEADER.size + middle * INDEX_RECORD.size
+            probe = self.index[start : start + KEY_SIZE]
+            if probe < key:
+                low = middle + 1
+            elif probe > key:
+                high = middle
+            else:
+                _key, segment, offset, length = INDEX_RECORD.unpack_from(
+                    self.index, start
+                )
+                return segment, offset, length
+        return None
+
+    def locate(self, article_id):
+        key = id_key(article_id)
+        location = self.delta.get(key)
+        if location is None and self.index is not None:
+            location = self._search(key)
+        return location
+
+    def get(self, article_id):
+        location = self.locate(article_id)
+        if location is None:
+            return None
+        segment, offset, length = location
+        if segment == self.segment:
+            self.log.flush()
+        with open(self._segment_path(segment), "rb") as f:
+            record = json.loads(os.pread(f.fileno(), length, offset))
+        return record if record.get("id") == article_id else None
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n"
+        line = line.encode("utf-8")
+        offset = self.log.tell()
+        self.log.write(line)
+        self.delta[id_key(record["id"])] = (self.segment, offset, len(line))
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_batch:
+            self.sync()
+        if offset + len(line) >= self.segment_bytes:
+            self._rotate()
+        if len(self.delta) >= self.index_delta:
+            self.merge_index()
+
+    def sync(self):
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.unsynced = 0
+
+    def _rotate(self):
+        self.sync()
+        self.log.close()
+        self.segment += 1
+        self.log = open(self._segment_path(self.segment), "ab")
+
+    def merge_index(self):
+        # Merge the sorted delta into the sorted index file, in one sequential pass
+        self.sync()
+        path = os.path.join(self.directory, INDEX_NAME)
+        delta = sorted(self.delta.items())
+        count = 0
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"\0" * INDEX_HEADER.size)
+            position = 0
+            for key, location in delta:
+                while position < self.count:
+                    start = INDEX_HEADER.size + position * INDEX_RECORD.size
+                    existing = self.index[start : start + KEY_SIZE]
+                    if existing > key:
+                        break
+                    position += 1
+                    if existing != key:
+                        f.write(self.index[start : start + INDEX_RECORD.size])
+                        count += 1
+                f.write(INDEX_RECORD.pack(key, *location))
+                count += 1
+            if position < self.count:
+                start = INDEX_HEADER.size + position * INDEX_RECORD.size
+                f.write(
+                    self.index[
+                        start : INDEX_HEADER.size + self.count * INDEX_RECORD.size
+                    ]
+                )
+                count += self.count - position
+            f.seek(0)
+            f.write(
+                INDEX_HEADER.pack(
+                    INDEX_MAGIC, INDEX_VERSION, count, self.segment, self.log.tell()
+                )
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.delta = {}
+        self._open_index()
+
+    def close(self, merge=True):
+        if merge and self.delta:
+            self.merge_index()
+        self.sync()
+        self.log.close()
+        if self.index is not None:
+            self.index.close()
+            self.index_file.close()
+
+
+def main(argv=None):
+    from scrapy.utils.project import data_path, get_project_settings
+
+    parser = argparse.ArgumentParser(description="Print a stored article by id.")
+    parser.add_argument("id", help="an article id, e.g. medrxiv_2020.03.10.20033001")
+    parser.add_argument("--root", help="sink directory, the project's by default")
+    args = parser.parse_args(argv)
+
+    settings = get_project_settings()
+    root = args.root or data_path(settings.get("NDJSON_SINK_DIR"))
+    archive = args.id.partition("_")[0]
+    sink = NdjsonSink(
+        os.path.join(root, archive),
+        segment_bytes=settings.getint("NDJSON_SINK_SEGMENT_BYTES"),
+        fsync_batch=settings.getint("NDJSON_SINK_FSYNC_BATCH"),
+        index_delta=settings.getint("NDJSON_SINK_INDEX_DELTA"),
+    )
+    try:
+        record = sink.get(args.id)
+    finally:
+        sink.close(merge=False)
+    if record is None:
+        sys.exit(f"Not found: {args.id}")
+    print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
 import scrapy
+import json
 import datetime
 
-from urllib.parse import urlparse
-from crossref.restful import Works
+from lxml import etree
+from parsel import Selector
+from parsel.csstranslator import HTMLTranslator
+from scrapy import signals
+from scrapy.spidermiddlewares.httperror import HttpError
+from urllib.parse import urlencode
 
+from scraper.bookmarks import BookmarkMixin
+from scraper.cache import PostedDateCache
+from scraper.checkpoint import CheckpointMixin
+from scraper.frontier import FrontierMixin
+from scraper.items import ArticleItem
+from scraper.metrics import time_selector
+from scraper.parsing import EXTRACTED_META
+from scraper.relevance import RelevanceMixin
+from scraper.seen import SeenIndexMixin
 
 # "List of Sections" constants
+LISTING_PATH = "/content/early/recent?page={page}"
 SECTION_SELECTOR = "div.pane-content > div.highwire-list-wrapper"
 NEXT_PAGE_SELECTOR = (
     'div.highwire-list.page-group-last.item-list > ul > li > a::attr("href")'
@@ -14,49 +29,418 @@ DATE_FORMAT = "%B %d, %Y"
 
 # "Section of Article items" constants
 ARTICLE_SELECTOR = "div > ul > li"
-SECTION_DATE_SELECTOR = "h3.highwire-list-title::text"
+SECTION_DATE_SELECTOR = "h3.highwire-list-title"
 
 # "Article item" constants
-TITLE_SELECTOR = "span.highwire-cite-title > a > span.highwire-cite-title::text"
-DOI_SELECTOR = "span.highwire-cite-metadata-doi::text"
-URL_SELECTOR = 'span.highwire-cite-title > a::attr("href")'
+TITLE_LINK_SELECTOR = "span.highwire-cite-title > a"
+TITLE_SELECTOR = "span.highwire-cite-title"
+DOI_SELECTOR = "span.highwire-cite-metadata-doi"
+
+# The selectors above are translated to XPath, and compiled, once. LISTING_XPATH
+# finds every section date, title link and DOI on a page in a single walk of the tree,
+# in document order. The DOI's label is a child element, so we take the first direct
+# text node that is not blank.
+_translator = HTMLTranslator()
+LISTING_XPATH = etree.XPath(
+    _translator.css_to_xpath(
+        f"{SECTION_SELECTOR} {SECTION_DATE_SELECTOR}, "
+        f"{SECTION_SELECTOR} {ARTICLE_SELECTOR} {TITLE_LINK_SELECTOR}, "
+        f"{SECTION_SELECTOR} {ARTICLE_SELECTOR} {DOI_SELECTOR}"
+    )
+)
+TITLE_XPATH = etree.XPath(
+    "normalize-space(%s/text())" % _translator.css_to_xpath(TITLE_SELECTOR, "")
+)
+DOI_XPATH = etree.XPath("normalize-space(text()[normalize-space()][1])")
+NEXT_PAGE_XPATH = etree.XPath(
+    _translator.css_to_xpath(NEXT_PAGE_SELECTOR), smart_strings=False
+)
+
+# "Crossref" constants
+CROSSREF_WORKS_URL = "https://api.crossref.org/works"
+CROSSREF_BATCH_SIZE = 20
+CROSSREF_DOWNLOAD_SLOT = "api.crossref.org"
+
+# "Details API" constants. With `-a source=api` the articles are read from the
+# archives' JSON API instead of the HTML listings, a window of posting dates at a
+# time. Each record is one version of an article, with its DOI and the date that
+# version was posted, so no follow-up requests are needed. See https://api.biorxiv.org
+DETAILS_API_URL = "https://api.biorxiv.org/details/{server}/{start}/{end}/{cursor}"
+DETAILS_WINDOW_DAYS = 7
+DETAILS_DATE_FORMAT = "%Y-%m-%d"
+
+# "Scheduling" constants. Within a website's queue the probes, which decide where
+# the bookmark's page is, go first, then listing pages, which move the crawl frontier,
+# then Crossref lookups and last the article pages.
+PROBE_PRIORITY = 30
+LISTING_PRIORITY = 20
+CROSSREF_PRIORITY = 10
+ARTICLE_PRIORITY = 0
 
 # "Article page" constants
 POSTED_SELECTOR = "ul.issue-toc-list li:first-child"
 POSTED_DATE_FORMAT = "%Y-%m-%d"
 
-# BOOKMARK is cursor that tracks just how far back we should scrape each time
-BOOKMARK = datetime.datetime(
-    year=2020, month=1, day=1
-)  # TODO factor bookmark into its own logic
 
+def extract_listing(root):
+    """Extract a highwire listing page as [(section date string, [article dict])].
+
+    Each article dict has "title", "doi" and "url" keys, with None for anything
+    missing from the markup, and articles appear in page order under their section.
+    """
+    sections = []
+    article = None
+    for element in LISTING_XPATH(root):
+        if element.tag == "h3":
+            sections.append(((element.text or "").strip(), []))
+        elif not sections:
+            continue
+        elif element.tag == "a":
+            # A title link starts each article, its DOI comes later in the markup
+            article = {
+                "title": TITLE_XPATH(element) or None,
+                "doi": None,
+                "url": (element.get("href") or "").strip() or None,
+            }
+            sections[-1][1].append(article)
+        elif article is not None:
+            article["doi"] = DOI_XPATH(element) or None
+    return sections
+
+
+def extract_next_page(root):
+    """Extract the link to a highwire listing's next page, None on the last page."""
+    links = NEXT_PAGE_XPATH(root)
+    return links[0] if links else None
+
+
+def extract_listing_page(body, encoding):
+    """Extract a highwire listing page's body as (listing, next page link).
+
+    The listing is as `extract_listing` returns it. Run by the parser pool, see
+    scraper/parsing.py.
+    """
+    root = Selector(body=body, encoding=encoding, type="html").root
+    return extract_listing(root), extract_next_page(root)
+
+
+class ArchiveSpiderBase(
+    CheckpointMixin, FrontierMixin, RelevanceMixin, SeenIndexMixin, BookmarkMixin
+):
+    # Opened in `from_crawler`, a spider made without a crawler does not cache
+    posted_date_cache = None
+    # "sequential" follows the next page link one page at a time. "fanout" finds the
+    # bookmark's page first and then fetches all the pages before it concurrently.
+    # Override with `scrapy crawl medrxiv -a paging=fanout`.
+    paging = "sequential"
+    # "listing" scrapes the HTML listing pages, "api" reads the details API instead.
+    # Override with `scrapy crawl medrxiv -a source=api`.
+    source = "listing"
+    # Left to the workers when crawling with `-a role=leader`
+    frontier_callbacks = ("parse_crossref", "parse_article_page")
+    # The listing pages are parsed off the reactor thread, see scraper/parsing.py
+    parser_pool_callbacks = {
+        "parse": extract_listing_page,
+        "parse_probe": extract_listing_page,
+        "parse_listing_page": extract_listing_page,
+    }
+    # Where fanout paging, and the details API windows, are up to
+    checkpoint_attributes = CheckpointMixin.checkpoint_attributes + (
+        "_probed_pages",
+        "_last_page_in_range",
+        "_first_page_out_of_range",
+        "_details_windows",
+        "_details_windows_left",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._probed_pages = set()
+        self._last_page_in_range = 0
+        self._first_page_out_of_range = None
+        self._details_windows = {}
+        self._details_windows_left = 0
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.posted_date_cache = PostedDateCache.from_settings(crawler.settings)
+        crawler.signals.connect(
+            spider._close_posted_date_cache, signal=signals.spider_closed
+        )
+        return spider
+
+    def _initial_requests(self):
+        if self.source == "api":
+            requests = list(self._request_details_windows())
+            self._details_windows_left = len(requests)
+            if not requests:
+                self._complete_paging()
+            return requests
+        elif self.source != "listing":
+            raise ValueError(f"Unknown source: {self.source}")
+        return super()._initial_requests()
+
+    def _close_posted_date_cache(self, spider):
+        for key, value in self.posted_date_cache.stats().items():
+            self.crawler.stats.set_value(f"posted_date_cache/{key}", value)
+        self.posted_date_cache.close()
 
-class ArchiveSpiderBase:
     def parse(self, response):
-        # Find all listed articles
-        for section in response.css(SECTION_SELECTOR):
-            section_date = self._get_section_date(section)
-            for article in section.css(ARTICLE_SELECTOR):
-                data = self._list_item_parser(article, section_date)
-                yield data
+        if self.paging == "fanout":
+            yield from self.parse_probe(response, page=0)
+            return
 
-        # Find the ling to the next page
-        next_page = response.css(NEXT_PAGE_SELECTOR).get()
+        sections, next_page = self._extract_page(response)
+        section_dates = yield from self._parse_listing(response, sections)
 
         # Decide if following to next page
-        if self._is_page_new(section_date) and next_page is not None:
+        if (
+            section_dates
+            and self._is_page_new(section_dates[-1])
+            and next_page is not None
+        ):
             self.logger.info(f"Follow to next page: {next_page}")
-            yield response.follow(next_page, callback=self.parse)
+            yield response.follow(
+                next_page,
+                callback=self.parse,
+                errback=self.listing_failed,
+                priority=LISTING_PRIORITY,
+            )
         else:
             self.logger.info(
-                f"Do not follow to next page, bookmark reached: {BOOKMARK}"
+                f"Do not follow to next page, bookmark reached: {self.bookmark_date}"
             )
+            self._complete_paging()
 
-    def _is_page_new(self, date):
-        return date > BOOKMARK
+    def parse_probe(self, response, page):
+        # Fanout paging, first find the last page newer than the bookmark by galloping
+        # (pages 1, 2, 4, 8, ...) then a binary search, one probe at a time. Then fetch
+        # every page up to it at once, skipping the probes. A probe's items are only
+        # emitted if the page is in range, so every item is emitted once.
+        self._probed_pages.add(page)
+        sections, _next_page = self._extract_page(response)
+        section_dates = [section_date for section_date, _articles in sections]
+        in_range = page == 0 or bool(
+            section_dates and self._is_page_new(section_dates[0])
+        )
+        if in_range:
+            yield from self._parse_listing(response, sections)
+            self._last_page_in_range = max(self._last_page_in_range, page)
+            if not section_dates or not self._is_page_new(section_dates[-1]):
+                self._first_page_out_of_range = page + 1
+        else:
+            self._set_page_out_of_range(page)
+        yield from self._continue_probing()
+
+    def probe_failed(self, failure):
+        # A failed probe is taken to be out of range, so probing carries on. That is
+        # right for a page past the last one, which is not found, but a probe that
+        # failed otherwise may have hidden pages in range, so the bookmark stays put.
+        page = failure.request.cb_kwargs["page"]
+        self._probed_pages.add(page)
+        if failure.check(HttpError) and failure.value.response.status == 404:
+            self.logger.info(f"Probe page {page} not found, out of range")
+        else:
+            self.listing_failed(failure)
+        self._set_page_out_of_range(page)
+        yield from self._continue_probing()
+
+    def _set_page_out_of_range(self, page):
+        if self._first_page_out_of_range is None:
+            self._first_page_out_of_range = page
+        else:
+            self._first_page_out_of_range = min(self._first_page_out_of_range, page)
+
+    def _continue_probing(self):
+        next_probe = self._next_probe()
+        if next_probe is not None:
+            self.logger.info(f"Probe page: {next_probe}")
+            yield scrapy.Request(
+                self._make_listing_url(next_probe),
+                callback=self.parse_probe,
+                errback=self.probe_failed,
+                cb_kwargs=dict(page=next_probe),
+                priority=PROBE_PRIORITY,
+            )
+            return
+
+        last_page = self._last_page_in_range
+        self.logger.info(
+            f"Fetch pages 1 to {last_page}, bookmark: {self.bookmark_date}"
+        )
+        self._complete_paging()
+        for page in range(1, last_page + 1):
+            if page not in self._probed_pages:
+                yield scrapy.Request(
+                    self._make_listing_url(page),
+                    callback=self.parse_listing_page,
+                    errback=self.listing_failed,
+                    priority=LISTING_PRIORITY,
+                )
+
+    def _next_probe(self):
+        low, high = self._last_page_in_range, self._first_page_out_of_range
+        if high is None:
+            return max(1, low * 2)
+        elif high - low <= 1:
+            return None
+        return (low + high) // 2
+
+    def parse_listing_page(self, response):
+        yield from self._parse_listing(response)
+
+    def _parse_listing(self, response, sections=None):
+        # Yields the page's items and Crossref requests, returns its section dates
+        if sections is None:
+            sections, _next_page = self._extract_page(response)
+        section_dates = []
+        pending = []
+        for section_date, articles in sections:
+            self._observe_date(section_date)
+            section_dates.append(section_date)
+            for article in articles:
+                data = self._list_item_parser(article, section_date)
+                if data is None:
+                    continue
+                elif self._is_awaiting_crossref(data):
+                    pending.append(data)
+                else:
+                    yield data
 
-    def _get_section_date(self, section):
-        date_string = section.css(SECTION_DATE_SELECTOR).get()
+        # Resolve the page's revisions with as few Crossref requests as possible
+        for batch in self._batch_pending(pending):
+            yield self._request_crossref(batch)
+        return section_dates
+
+    def _extract_page(self, response):
+        # Returns the page's sections, with their dates parsed, and the link to the
+        # next page. The parser pool may have extracted them already.
+        extracted = response.meta.get(EXTRACTED_META)
+        if extracted is None:
+            root = response.selector.root
+            with time_selector(self, "listing"):
+                listing = extract_listing(root)
+            with time_selector(self, "next_page"):
+                next_page = extract_next_page(root)
+        else:
+            listing, next_page = extracted
+        sections = [
+            (self._get_section_date(date_string), articles)
+            for date_string, articles in listing
+        ]
+        return sections, next_page
+
+    def _request_details_windows(self, today=None):
+        # The windows are independent, each is paged through on its own
+        start = self.bookmark_date.date() + datetime.timedelta(days=1)
+        today = today or datetime.date.today()
+        while start <= today:
+            end = min(start + datetime.timedelta(days=DETAILS_WINDOW_DAYS - 1), today)
+            yield self._request_details(
+                start.strftime(DETAILS_DATE_FORMAT),
+                end.strftime(DETAILS_DATE_FORMAT),
+                cursor=0,
+            )
+            start = end + datetime.timedelta(days=1)
+
+    def _request_details(self, start, end, cursor):
+        # The spiders are named after the API's servers
+        url = DETAILS_API_URL.format(
+            server=self.name, start=start, end=end, cursor=cursor
+        )
+        request = scrapy.Request(
+            url,
+            callback=self.parse_details,
+            errback=self.listing_failed,
+            cb_kwargs=dict(start=start, end=end, cursor=cursor),
+            headers={"Accept": "application/json"},
+            priority=LISTING_PRIORITY,
+        )
+        return request
+
+    def parse_details(self, response, start, end, cursor):
+        # A window's versions of an article may be spread over its pages, so the
+        # articles are only emitted once the last page of the window is read
+        with time_selector(self, "details"):
+            details = json.loads(response.text)
+        records = details.get("collection") or []
+        messages = details.get("messages") or [{}]
+        total = int(messages[0].get("total") or 0)
+
+        articles = self._details_windows.setdefault((start, end), {})
+        for record in records:
+            self._add_details_record(articles, record)
+
+        next_cursor = cursor + len(records)
+        if records and next_cursor < total:
+            yield self._request_details(start, end, next_cursor)
+            return
+
+        del self._details_windows[(start, end)]
+        self._details_windows_left -= 1
+        if self._details_windows_left == 0:
+            self._complete_paging()
+        self.logger.info(f"Read {len(articles)} articles posted {start} to {end}")
+        pending = []
+        for doi, article in articles.items():
+            data = self._details_item_parser(doi, article)
+            if self._is_awaiting_crossref(data):
+                pending.append(data)
+            elif data is not None:
+                yield data
+        for batch in self._batch_pending(pending):
+            yield self._request_crossref(batch)
+
+    def _add_details_record(self, articles, record):
+        # Keep the title and number of the latest version, and the date of the first
+        posted_date = datetime.datetime.strptime(record["date"], DETAILS_DATE_FORMAT)
+        version = int(record["version"])
+        self._observe_date(posted_date)
+        article = articles.setdefault(
+            record["doi"],
+            {
+                "title": None,
+                "abstract": None,
+                "version": 0,
+                "original": None,
+            },
+        )
+        if version > article["version"]:
+            article["title"] = " ".join(record["title"].split()) or None
+            article["abstract"] = record.get("abstract")
+            article["version"] = version
+        if version == 1:
+            article["original"] = posted_date
+
+    def _details_item_parser(self, doi, article):
+        data = ArticleItem(title=article["title"], doi=doi)
+        data.url = f"{self.domain}/content/{doi}v{article['version']}"
+        data = self._add_id(data)
+        data.is_revision = self._is_article_revision(data.url)
+        if not self._is_relevant(data.title, article["abstract"]):
+            return None
+        if self._is_seen(data):
+            return None
+        # The posted date is that of the first version. A revision whose first version
+        # is older than the window takes it from the cache, filled by earlier runs,
+        # or else is resolved like a revision on a listing page: left to the Crossref
+        # batch, or after a cached Crossref miss, read from its article info page.
+        posted_date = article["original"]
+        if posted_date is not None:
+            self._set_cached_posted_date(data, posted_date)
+            return self._add_posted_date(data, posted_date)
+        hit, posted_date = self._get_cached_posted_date(data)
+        if posted_date:
+            return self._add_posted_date(data, posted_date)
+        elif not hit:
+            return data
+        return self._request_article_info(data)
+
+    def _make_listing_url(self, page):
+        return self.domain + LISTING_PATH.format(page=page)
+
+    def _get_section_date(self, date_string):
         if not date_string:
             self.logger.error("No title date found on page!")
             raise ValueError("stale section date selector")
@@ -66,31 +450,30 @@ class ArchiveSpiderBase:
         return url is not None and not url.endswith("v1")
 
     def _list_item_parser(self, item, section_date):
-        # Extract data
-        data = {
-            "title": item.css(TITLE_SELECTOR).get(),
-            "doi": item.css(DOI_SELECTOR).get(),
-            "url": item.css(URL_SELECTOR).get(),
-        }
-        # Clean data
-        for key in data.keys():
-            value = data[key]
-            if value:
-                data[key] = value.strip()
-        # Clean DOI
-        doi = data.get("doi")
+        # The extracted values are already stripped
+        data = ArticleItem(title=item["title"])
+        # Clean DOI, keep only the path of a https://doi.org/... link
+        doi = item["doi"]
         if doi:
-            parsed_doi = urlparse(doi).path.strip("/")
-            data["doi"] = parsed_doi
+            _scheme, separator, rest = doi.partition("://")
+            if separator:
+                doi = rest.partition("/")[2]
+            data.doi = doi.strip("/")
         # Concat URL with domain
-        url = data.get("url")
+        url = item["url"]
         if url:
-            data["url"] = self.domain + url
-        # Add `id` key and string value
+            data.url = self.domain + url
+        # Add `id` string value
         data = self._add_id(data)
-        # Add `is_revision` key and boolean value
-        data["is_revision"] = self._is_article_revision(data.get("url"))
-        # Add `posted` key and datetime value by scraping the original page
+        # Add `is_revision` boolean value
+        data.is_revision = self._is_article_revision(data.url)
+        # Skip unrelated articles, a revision would need a request for its posted date
+        if not self._is_relevant(data.title, follow_up=data.is_revision):
+            return None
+        # Skip articles stored by an earlier run, they need no posted date
+        if self._is_seen(data):
+            return None
+        # Add `posted` date value by scraping the original page
         data_or_request = self._do_posted_date(data, section_date)
         return data_or_request
 
@@ -101,39 +484,115 @@ class ArchiveSpiderBase:
         # 3) Fallback to the date on the article info page
         # 4) Fallback to the date on the website
         #
+        # Dates resolved on earlier crawls are kept in the posted date cache, a cached
+        # Crossref miss goes straight to the article info page.
+        #
         # Why complexity? Reduce the amount of slow HTTP requests. DOI request
         #    returns JSON and is faster than scraping another HTML page. Why not scrape
         #    the v1 for the date in article info? Its the same as the section date in
         #    the list, so is already available.
-        if data.get("is_revision"):
-            doi = data.get("doi")
-            if doi:
-                posted_date = self._posted_date_from_doi(doi)
-            else:
-                posted_date = None
-
-            if not posted_date:
-                article_info_url = self._make_article_info_url(data["url"])
-                request = scrapy.Request(
-                    article_info_url,
-                    callback=self.parse_article_page,
-                    cb_kwargs=dict(data=data),
-                )
-                return request
+        #
+        # Revisions with a DOI are returned without a posted date, `parse` gathers them
+        # up and resolves them together with a batched Crossref query.
+        if data.is_revision:
+            hit, posted_date = self._get_cached_posted_date(data)
+            if posted_date:
+                return self._add_posted_date(data, posted_date)
+            elif data.doi and not hit:
+                return data
             else:
-                date = posted_date
-        else:
-            date = section_date
+                return self._request_article_info(data)
 
-        data = self._add_posted_date(data, date)
+        data = self._add_posted_date(data, section_date)
         return data
 
+    def _posted_date_cache_key(self, data):
+        return data.doi or data.url
+
+    def _get_cached_posted_date(self, data):
+        if self.posted_date_cache is None:
+            return False, None
+        return self.posted_date_cache.get(self._posted_date_cache_key(data))
+
+    def _set_cached_posted_date(self, data, date):
+        if self.posted_date_cache is not None:
+            self.posted_date_cache.set(self._posted_date_cache_key(data), date)
+
+    def _is_awaiting_crossref(self, data_or_request):
+        return (
+            isinstance(data_or_request, ArticleItem) and data_or_request.posted is None
+        )
+
+    def _batch_pending(self, pending):
+        for start in range(0, len(pending), CROSSREF_BATCH_SIZE):
+            yield pending[start : start + CROSSREF_BATCH_SIZE]
+
+    def _request_crossref(self, pending):
+        # One filtered query resolves all DOIs in the batch. Crossref gets its own
+        # download slot, and so its own concurrency limit (see DOWNLOAD_SLOTS in
+        # settings), independent of the archive's domain.
+        doi_filter = ",".join("doi:" + data.doi for data in pending)
+        query = urlencode(
+            {"filter": doi_filter, "select": "DOI,posted", "rows": len(pending)}
+        )
+        request = scrapy.Request(
+            CROSSREF_WORKS_URL + "?" + query,
+            callback=self.parse_crossref,
+            errback=self.crossref_failed,
+            cb_kwargs=dict(pending=pending),
+            headers={"Accept": "application/json"},
+            meta={"download_slot": CROSSREF_DOWNLOAD_SLOT},
+            priority=CROSSREF_PRIORITY,
+        )
+        return request
+
+    def _request_article_info(self, data):
+        # The URL names the article version, so the page never changes once stored
+        article_info_url = self._make_article_info_url(data.url)
+        request = scrapy.Request(
+            article_info_url,
+            callback=self.parse_article_page,
+            cb_kwargs=dict(data=data),
+            meta={"cache_immutable": True},
+            priority=ARTICLE_PRIORITY,
+        )
+        return request
+
     def _make_article_info_url(self, url):
         return url + ".article-info"
 
+    def parse_crossref(self, response, pending):
+        self.logger.debug(f"visited={response.url}")
+        try:
+            works = json.loads(response.text)["message"]["items"]
+        except (ValueError, KeyError, TypeError):
+            works = []
+        posted_dates = {
+            work["DOI"].lower(): self._posted_date_from_doi(work)
+            for work in works
+            if "DOI" in work
+        }
+        # Fan the dates back out, anything the batch missed gets the article info page
+        for data in pending:
+            posted_date = posted_dates.get(data.doi.lower())
+            self._set_cached_posted_date(data, posted_date)
+            if posted_date:
+                yield self._add_posted_date(data, posted_date)
+            else:
+                yield self._request_article_info(data)
+
+    def crossref_failed(self, failure):
+        pending = failure.request.cb_kwargs["pending"]
+        self.logger.warning(
+            f"Crossref lookup failed for {len(pending)} DOIs: {failure.value}"
+        )
+        for data in pending:
+            yield self._request_article_info(data)
+
     def parse_article_page(self, response, data):
         self.logger.debug(f"visited={response.url}")
-        epoch_seconds = response.css(POSTED_SELECTOR).attrib.get("date")
+        with time_selector(self, "article_info"):
+            epoch_seconds = response.css(POSTED_SELECTOR).attrib.get("date")
         if not epoch_seconds:
             self.logger.error("No info date found on page!")
             raise ValueError(
@@ -142,22 +601,21 @@ class ArchiveSpiderBase:
         else:
             epoch_seconds = int(epoch_seconds)
         date = datetime.datetime.fromtimestamp(epoch_seconds)
+        self._set_cached_posted_date(data, date)
         data = self._add_posted_date(data, date)
         yield data
 
     def _add_posted_date(self, data, date):
-        data["posted"] = date.strftime(POSTED_DATE_FORMAT)
+        data.set_posted_date(date)
         return data
 
     def _add_id(self, data):
-        doi = data["doi"]
-        _ignore, article_id = doi.split("/", maxsplit=1)
-        data["id"] = self.id_prefix + "_" + article_id
+        _ignore, article_id = data.doi.split("/", maxsplit=1)
+        data.id = self.id_prefix + "_" + article_id
         return data
 
-    def _posted_date_from_doi(self, doi):
+    def _posted_date_from_doi(self, doi_data):
         # Handle bad DOI or absent DOIs
-        doi_data = self.works.doi(doi)
         if doi_data:
             date_dict = doi_data.get("posted", {})
         else:
@@ -187,7 +645,6 @@ class MedRXIVSpider(ArchiveSpiderBase, scrapy.Spider):
     start_urls = ["https://www.medrxiv.org/content/early/recent?page=0"]
     domain = "https://www.medrxiv.org"
     id_prefix = "medrxiv"
-    works = Works()
 
 
 class BioRXIVSpider(ArchiveSpiderBase, scrapy.Spider):
@@ -195,4 +652,3 @@ class BioRXIVSpider(ArchiveSpiderBase, scrapy.Spider):
     start_urls = ["https://www.biorxiv.org/content/early/recent?page=0"]
     domain = "https://www.biorxiv.org"
     id_prefix = "biorxiv"
-    works = Works()
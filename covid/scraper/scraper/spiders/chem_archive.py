@@ -1,67 +1,127 @@
 import scrapy
-import json
 import datetime
 
-POSTED_DATE_FORMAT = "%Y-%m-%d"
-
-# BOOKMARK is cursor that tracks just how far back we should scrape each time
-BOOKMARK = datetime.datetime(
-    year=2020, month=1, day=1
-)  # TODO factor bookmark into its own logic
-
-
-class ChemRXIVSpider(scrapy.Spider):
+from urllib.parse import urlencode
+
+from scraper.bookmarks import BookmarkMixin
+from scraper.checkpoint import CheckpointMixin
+from scraper.frontier import FrontierMixin
+from scraper.items import ArticleItem
+from scraper.jsonstream import iter_members
+from scraper.relevance import RelevanceMixin
+
+# "Paging" constants. The page size starts at what the website itself asks for and
+# then adapts: it doubles while pages download well within the target latency, and
+# halves when they take longer.
+API_URL = "https://chemrxiv.org/api/institutions/259/items"
+API_QUERY = {
+    "types": "",
+    "licenses": "",
+    "orderBy": "published_date",
+    "orderType": "desc",
+    "search": "",
+    "categories": "",
+    "itemTypes": "articles",
+}
+PAGE_SIZE_START = 40
+PAGE_SIZE_MIN = 20
+PAGE_SIZE_MAX = 320
+PAGE_TARGET_LATENCY = 2.0
+
+
+class ChemRXIVSpider(
+    CheckpointMixin, FrontierMixin, RelevanceMixin, BookmarkMixin, scrapy.Spider
+):
     name = "chemrxiv"
-    start_urls = [
-        "https://chemrxiv.org/api/institutions/259/items?types=&licenses=&orderBy=published_date&orderType=desc&limit=40&search=&categories=&itemTypes=articles"
-    ]
     id_prefix = "chemrxiv"
+    page_size = PAGE_SIZE_START
+    checkpoint_attributes = CheckpointMixin.checkpoint_attributes + ("page_size",)
+
+    @property
+    def start_urls(self):
+        return [self._make_page_url(self.page_size)]
 
     def parse(self, response):
         # Chem archrive features an infinite scrolling site that makes a JSON request
         # for 40 new items upon each scrolling event. The first request is without a
         # cursor query. The first response returns 40 items + a cursor. Subsequent
         # requests need this cursor.
-
-        json_data = json.loads(response.body_as_unicode())
-        cursor = self._extract_cursor(json_data)
-        article_stubs = self._extract_stubs(json_data)
-
-        dates = []
-        for stub in article_stubs:
-            data = self._process_stub(stub)
-            dates.append(self._get_publication_date(stub))
-            yield data
-
-        if dates:
-            oldest_date = min(dates)
-        else:
-            oldest_date = None
-
+        #
+        # The items are decoded one at a time, newest first, so we can stop part way
+        # through a page as soon as we pass the bookmark. The cursor comes before the
+        # items, so the rest of the page is not even read then.
+
+        cursor = None
+        oldest_date = None
+        for key, value in iter_members(response.text, lazy_keys=("items",)):
+            if key == "cursor":
+                cursor = self._extract_cursor(value)
+            elif key == "items":
+                for stub in value:
+                    date = self._get_publication_date(stub)
+                    oldest_date = date
+                    if not self._is_page_new(date):
+                        break
+                    self._observe_date(date)
+                    data = self._process_stub(stub)
+                    if data is not None:
+                        yield data
+                if (
+                    cursor is not None
+                    and oldest_date is not None
+                    and not self._is_page_new(oldest_date)
+                ):
+                    break
+
+        self.page_size = self._adapt_page_size(response)
         next_page = self._next_json_page(cursor)
+        self._save_frontier_cursor(cursor)
 
-        if oldest_date is not None and self._is_page_new(oldest_date):
+        if cursor is None:
+            self.logger.info("Do not follow to next page, no cursor")
+            self._complete_paging()
+        elif oldest_date is not None and self._is_page_new(oldest_date):
             self.logger.info(f"Follow to next page: {next_page}")
-            yield response.follow(next_page, callback=self.parse)
+            yield response.follow(
+                next_page, callback=self.parse, errback=self.listing_failed
+            )
         else:
             self.logger.info(
-                f"Do not follow to next page, bookmark reached: {BOOKMARK}"
+                f"Do not follow to next page, bookmark reached: {self.bookmark_date}"
             )
-
-    def _extract_cursor(self, json_data):
-        return json_data["cursor"]
-
-    def _extract_stubs(self, json_data):
-        return json_data["items"]
+            self._complete_paging()
+
+    def _adapt_page_size(self, response):
+        latency = response.meta.get("download_latency")
+        if latency is None:
+            return self.page_size
+        elif latency < PAGE_TARGET_LATENCY / 2:
+            return min(self.page_size * 2, PAGE_SIZE_MAX)
+        elif latency > PAGE_TARGET_LATENCY:
+            return max(self.page_size // 2, PAGE_SIZE_MIN)
+        return self.page_size
+
+    def _make_page_url(self, page_size, cursor=None):
+        query = dict(API_QUERY, limit=page_size)
+        if cursor is not None:
+            query["cursor"] = cursor
+        return API_URL + "?" + urlencode(query)
+
+    def _extract_cursor(self, cursor):
+        return cursor
 
     def _process_stub(self, stub_data):
-        data = {
-            "title": self._get_article_title(stub_data),
-            "url": self._get_article_url(stub_data),
-            "posted": self._get_article_posted_date(stub_data),
-            "is_revision": self._get_revision_status(stub_data),
-            "id": self._get_article_id(stub_data),
-        }
+        # Unrelated articles are dropped, the listing has everything we need of them
+        texts = (stub_data["data"]["title"], stub_data["data"].get("abstract"))
+        if not self._is_relevant(*texts):
+            return None
+        data = ArticleItem(
+            title=self._get_article_title(stub_data),
+            url=self._get_article_url(stub_data),
+            posted=self._get_article_posted_date(stub_data),
+            is_revision=self._get_revision_status(stub_data),
+            id=self._get_article_id(stub_data),
+        )
         return data
 
     def _get_article_title(self, stub_data):
@@ -74,8 +134,7 @@ class ChemRXIVSpider(scrapy.Spider):
         date_string = stub_data["data"]["timeline"]["posted"]
         date_string = date_string.strip("Z")
         date_time = datetime.datetime.fromisoformat(date_string)
-        date = date_time.strftime(POSTED_DATE_FORMAT)
-        return date
+        return date_time.toordinal()
 
     def _get_revision_status(self, stub_data):
         version = stub_data["data"]["version"]
@@ -89,10 +148,8 @@ class ChemRXIVSpider(scrapy.Spider):
         date_string = date_string.strip("Z")
         return datetime.datetime.fromisoformat(date_string)
 
-    def _is_page_new(self, date):
-        return date > BOOKMARK
+    def _cursor_url(self, cursor):
+        return self._next_json_page(cursor)
 
     def _next_json_page(self, cursor):
-        base = self.start_urls[0]
-        return base + f"&cursor={cursor}"
-
+        return self._make_page_url(self.page_size, cursor)
@@ -1,13 +1,31 @@
 import scrapy
 import datetime
+from io import BytesIO
 from lxml import etree
 
-POSTED_DATE_FORMAT = "%Y-%m-%d"
+from scraper.bookmarks import BookmarkMixin
+from scraper.checkpoint import CheckpointMixin
+from scraper.frontier import FrontierMixin
+from scraper.items import ArticleItem
+from scraper.metrics import time_selector
+from scraper.parsing import EXTRACTED_META
+from scraper.relevance import RelevanceMixin
+from scraper.seen import SeenIndexMixin
 
-# BOOKMARK is cursor that tracks just how far back we should scrape each time
-BOOKMARK = datetime.datetime(
-    year=2020, month=1, day=1
-)  # TODO factor bookmark into its own logic
+# "OAI-PMH page" constants. One XPath, compiled once, collects all the fields of a
+# record as a dict keyed by the local tag name. We match the metadata tags with a
+# wildcard because their namespace was not declared in the document header.
+OAI_NAMESPACES = {"ns": "http://www.openarchives.org/OAI/2.0/"}
+RECORD_TAG = "{http://www.openarchives.org/OAI/2.0/}record"
+RESUMPTION_TOKEN_TAG = "{http://www.openarchives.org/OAI/2.0/}resumptionToken"
+RECORD_FIELDS_XPATH = etree.XPath(
+    "ns:header/ns:datestamp | ns:metadata//*[not(*)]", namespaces=OAI_NAMESPACES
+)
+
+# "Scheduling" constants. The next OAI page goes ahead of the article pages queued
+# before it, so the crawl frontier keeps moving.
+LISTING_PRIORITY = 20
+ARTICLE_PRIORITY = 0
 
 # "Article page" constants
 REVISION_TABLE_SELECTOR = "#tab_bg tr"
@@ -15,29 +33,95 @@ REVISION_DATE_SELECTOR = "#tab_bg tr:last-child td:nth-child(2)::text"
 REVISION_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 
-class ChinaXIVSpider(scrapy.Spider):
+def iter_oai_elements(body):
+    # Yields each record and the resumption token, clearing each one, and the
+    # siblings before it, once the caller is done with it
+    events = etree.iterparse(
+        BytesIO(body), events=("end",), tag=(RECORD_TAG, RESUMPTION_TOKEN_TAG)
+    )
+    for _event, element in events:
+        yield element
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def extract_cursor(element):
+    return element.text or None
+
+
+def extract_stub(element):
+    # Where a tag repeats, e.g. a second language title, the last one wins
+    stub_data = {}
+    for field in RECORD_FIELDS_XPATH(element):
+        local_name = field.tag.rpartition("}")[2]
+        stub_data[local_name] = field.text
+    return stub_data
+
+
+def extract_oai_page(body, encoding=None):
+    """Extract an OAI-PMH page as [("record", stub dict) or ("cursor", token)].
+
+    The entries are in document order, and a stub maps the local tag names of a
+    record's fields to their text. Run by the parser pool, see scraper/parsing.py.
+    """
+    entries = []
+    for element in iter_oai_elements(body):
+        if element.tag == RESUMPTION_TOKEN_TAG:
+            entries.append(("cursor", extract_cursor(element)))
+        else:
+            entries.append(("record", extract_stub(element)))
+    return entries
+
+
+class ChinaXIVSpider(
+    CheckpointMixin,
+    FrontierMixin,
+    RelevanceMixin,
+    SeenIndexMixin,
+    BookmarkMixin,
+    scrapy.Spider,
+):
     name = "chinaxiv"
     start_urls = [
         "http://www.chinaxiv.org/oai/OAIHandler?verb=ListRecords&metadataPrefix=oai_eprint"
     ]
     id_prefix = "chinaxiv"
+    # "metadata" takes posted dates and versions from the OAI records, and only
+    # fetches the article page when they are ambiguous. "html" always fetches it.
+    # Override with `scrapy crawl chinaxiv -a harvest_mode=html`.
+    harvest_mode = "metadata"
+    # Left to the workers when crawling with `-a role=leader`
+    frontier_callbacks = ("parse_article_page",)
+    # The OAI pages are parsed off the reactor thread, see scraper/parsing.py
+    parser_pool_callbacks = {"parse": extract_oai_page}
 
     def parse(self, response):
         # China archrive features an API site that makes an XML request for 100 new
         # items. The first request is without a cursor query. The first response returns
         # 100 items + a cursor. Subsequent requests need this cursor.
+        #
+        # Records are processed as they are parsed, and then dropped from the tree, so
+        # memory stays flat however large the page. A page parsed by the parser pool
+        # arrives as the list of records `extract_oai_page` returns instead.
 
-        xml_root = etree.fromstring(response.body)
-        self.nsmap = {k if k else "ns": v for k, v in xml_root.nsmap.items()}
-
-        cursor = self._extract_cursor(xml_root)
-        article_stubs = self._extract_stubs(xml_root)
-
+        cursor = None
         dates = []
-        for stub in article_stubs:
+        entries = response.meta.get(EXTRACTED_META)
+        if entries is None:
+            entries = self._iter_oai_page(response.body)
+        for kind, value in entries:
+            if kind == "cursor":
+                cursor = value
+                continue
+            stub = value
             data = self._process_stub(stub)
-            dates.append(self._get_publication_date(stub))
-            yield data
+            date = self._get_publication_date(stub)
+            if date is not None:
+                self._observe_date(date)
+                dates.append(date)
+            if data is not None:
+                yield data
 
         if dates:
             oldest_date = min(dates)
@@ -45,19 +129,31 @@ class ChinaXIVSpider(scrapy.Spider):
             oldest_date = None
 
         next_page = self._next_xml_page(cursor)
+        self._save_frontier_cursor(cursor)
 
-        if oldest_date is not None and self._is_page_new(oldest_date):
+        if next_page is None:
+            self.logger.info("Do not follow to next page, no resumption token")
+            self._complete_paging()
+        elif oldest_date is not None and self._is_page_new(oldest_date):
             self.logger.info(f"Follow to next page: {next_page}")
-            yield response.follow(next_page, callback=self.parse)
+            yield response.follow(
+                next_page,
+                callback=self.parse,
+                errback=self.listing_failed,
+                priority=LISTING_PRIORITY,
+            )
         else:
             self.logger.info(
-                f"Do not follow to next page, bookmark reached: {BOOKMARK}"
+                f"Do not follow to next page, bookmark reached: {self.bookmark_date}"
             )
+            self._complete_paging()
 
     def parse_article_page(self, response, data):
         self.logger.debug(f"visited={response.url}")
         # Process the V1 date from the table
-        date_string = response.css(REVISION_DATE_SELECTOR).get()
+        with time_selector(self, "revision_table"):
+            date_string = response.css(REVISION_DATE_SELECTOR).get()
+            revision_rows = response.css(REVISION_TABLE_SELECTOR).re("V2")
         if not date_string:
             self.logger.error("No revision date found on page!")
             raise ValueError(
@@ -66,70 +162,118 @@ class ChinaXIVSpider(scrapy.Spider):
         else:
             date_string = date_string.strip()
         date = datetime.datetime.strptime(date_string, REVISION_DATE_FORMAT)
-        data["posted"] = date.strftime(POSTED_DATE_FORMAT)
+        data.set_posted_date(date)
         # Process whether there is a row with V2, and thus determine if there are revisions
-        data["is_revision"] = bool(response.css(REVISION_TABLE_SELECTOR).re("V2"))
+        data.is_revision = bool(revision_rows)
         yield data
 
-    def _extract_cursor(self, xml_root):
-        elements = xml_root.xpath("//ns:resumptionToken/text()", namespaces=self.nsmap)
-        try:
-            cursor = elements[0]
-        except IndexError:
-            cursor = None
-        return cursor
-
-    def _extract_stubs(self, xml_root):
-        return xml_root.xpath("//ns:ListRecords/ns:record", namespaces=self.nsmap)
+    def _iter_oai_page(self, body):
+        # Like `extract_oai_page`, but each record is parsed as the caller asks for it
+        for element in iter_oai_elements(body):
+            if element.tag == RESUMPTION_TOKEN_TAG:
+                yield "cursor", extract_cursor(element)
+            else:
+                with time_selector(self, "oai_record"):
+                    stub = extract_stub(element)
+                yield "record", stub
 
     def _process_stub(self, stub_data):
-        data = {
-            "title": self._get_article_title(stub_data),
-            "url": self._get_article_url(stub_data),
-            "id": self._get_article_id(stub_data),
-        }
+        posted_date, is_revision = None, None
+        if self.harvest_mode == "metadata":
+            posted_date, is_revision = self._posted_date_from_record(stub_data)
+        # Skip unrelated articles, without a posted date they would need an article page
+        texts = (stub_data.get("title"), stub_data.get("description"))
+        if not self._is_relevant(*texts, follow_up=posted_date is None):
+            return None
+        data = ArticleItem(
+            title=self._get_article_title(stub_data),
+            url=self._get_article_url(stub_data),
+            id=self._get_article_id(stub_data),
+            fingerprint=self._get_article_fingerprint(stub_data),
+        )
+        # Skip articles stored by an earlier run, they need no article page
+        if self._is_seen(data):
+            return None
+        if posted_date is not None:
+            self.crawler.stats.inc_value("chinaxiv/metadata_resolved")
+            data.set_posted_date(posted_date)
+            data.is_revision = is_revision
+            return data
+        self.crawler.stats.inc_value("chinaxiv/html_fetches")
         request = self._request_posted_date(data)
         return request
 
+    def _posted_date_from_record(self, stub_data):
+        # The record's `createtime` is when the first version was submitted, which is
+        # the V1 date the article page's revision table would give us. Whether there
+        # are revisions comes from the `version` element, when the record has one, or
+        # else from the header datestamp: a record not modified since the day it was
+        # created has only one version. Anything else, or a record without a usable
+        # `createtime`, is ambiguous, (None, None).
+        posted_date = self._get_publication_date(stub_data)
+        if posted_date is None:
+            return None, None
+        version = self._get_article_version(stub_data)
+        if version is not None:
+            return posted_date, version > 1
+        datestamp = self._get_record_datestamp(stub_data)
+        if datestamp is not None and datestamp.date() == posted_date.date():
+            return posted_date, False
+        return None, None
+
     def _request_posted_date(self, data):
-        # Scrape the article page, because the posted date is not in the XML
-        article_info_url = data["url"]
+        # Scrape the article page, because the posted date is not in the XML. The V1
+        # date we take from it never changes, so the page is cached for good.
+        article_info_url = data.url
         request = scrapy.Request(
             article_info_url,
             callback=self.parse_article_page,
             cb_kwargs=dict(data=data),
+            meta={"cache_immutable": True},
+            priority=ARTICLE_PRIORITY,
         )
         return request
 
     def _get_article_title(self, stub_data):
-        title = stub_data.xpath(
-            "ns:metadata//*[local-name()='title']/text()", namespaces=self.nsmap
-        ).pop()
-        return title
+        return stub_data["title"]
 
     def _get_article_url(self, stub_data):
-        # We use the namespace XML wildcard because the namespace for this tag was not
-        # declared in the document header.
-        url = stub_data.xpath(
-            "ns:metadata//*[local-name()='url']/text()", namespaces=self.nsmap
-        ).pop()
-        return url
+        return stub_data["url"]
 
     def _get_article_id(self, stub_data):
-        article_id = stub_data.xpath(
-            "ns:metadata//*[local-name()='id']/text()", namespaces=self.nsmap
-        ).pop()
-        return self.id_prefix + "_" + article_id
+        return self.id_prefix + "_" + stub_data["id"]
+
+    def _get_article_fingerprint(self, stub_data):
+        # The URL is the same for every version of an article, but the header
+        # datestamp moves whenever the record changes, e.g. on a new version
+        datestamp = (stub_data.get("datestamp") or "").strip()
+        version = (stub_data.get("version") or "").strip()
+        return f"{stub_data['url']}@{datestamp}/{version}"
 
     def _get_publication_date(self, stub_data):
-        date_string = stub_data.xpath(
-            "ns:metadata//*[local-name()='createtime']/text()", namespaces=self.nsmap
-        ).pop()
-        date_string = date_string.strip("Z")
-        return datetime.datetime.fromisoformat(date_string)
-
-    def _is_page_new(self, date):
-        return date > BOOKMARK
+        try:
+            return datetime.datetime.fromisoformat(
+                stub_data["createtime"].strip().strip("Z")
+            )
+        except (KeyError, AttributeError, ValueError):
+            return None
+
+    def _get_article_version(self, stub_data):
+        try:
+            return int(stub_data["version"].strip().lstrip("vV"))
+        except (KeyError, AttributeError, ValueError):
+            return None
+
+    def _get_record_datestamp(self, stub_data):
+        try:
+            return datetime.datetime.fromisoformat(
+                stub_data["datestamp"].strip().strip("Z")
+            )
+        except (KeyError, AttributeError, ValueError):
+            return None
+
+    def _cursor_url(self, cursor):
+        return self._next_xml_page(cursor)
 
     def _next_xml_page(self, cursor):
         if cursor:
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+# Daily and weekly article counts, per archive, from the columnar store.
+#
+# From a notebook:
+#
+#     from scraper.timeseries import load
+#     series = load("medrxiv")
+#     dates, counts = series.weekly()
+#
+# Or from the scraper project directory:
+#
+#     python -m scraper.timeseries medrxiv --freq weekly --rolling 4
+
+import os
+import sys
+import argparse
+import datetime
+
+import numpy as np
+
+from scrapy.utils.project import data_path, get_project_settings
+
+from scraper.columnar import ColumnarStore, DAILY_COUNTS_FILE
+
+ARCHIVES = ("medrxiv", "biorxiv", "chemrxiv", "chinaxiv")
+KINDS = ("all", "new", "revision")
+
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+_cache = {}
+
+
+def _to_datetime64(ordinals):
+    return (ordinals - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+class TimeSeries:
+    """Counts of articles posted per day, split into new articles and revisions.
+
+    Built once from the posted and revision columns, with a single `np.bincount`
+    per kind over a dense index of days. Every query is then an array operation
+    over that index and is cached on the instance.
+    """
+
+    def __init__(self, posted, is_revision):
+        posted = np.asarray(posted, dtype=np.int64)
+        is_revision = np.asarray(is_revision, dtype=bool)
+        if posted.size:
+            self.first = int(posted.min())
+            length = int(posted.max()) - self.first + 1
+        else:
+            self.first, length = datetime.date.today().toordinal(), 0
+        offsets = posted - self.first
+        revisions = np.bincount(offsets[is_revision], minlength=length)
+        new = np.bincount(offsets[~is_revision], minlength=length)
+        self.ordinals = np.arange(self.first, self.first + length)
+        self.counts = {"all": new + revisions, "new": new, "revision": revisions}
+        self._results = {}
+
+    def _cached(self, key, compute):
+        if key not in self._results:
+            self._results[key] = compute()
+        return self._results[key]
+
+    def __len__(self):
+        return int(self.counts["all"].sum())
+
+    def daily(self, kind="all"):
+        return _to_datetime64(self.ordinals), self.counts[kind]
+
+    def weekly(self, kind="all"):
+        # Weeks start on Monday, ordinal 1 is Monday 0001-01-01
+        def compute():
+            weeks = (self.ordinals - 1) // 7
+            if not weeks.size:
+                return _to_datetime64(weeks), weeks
+            first_week = weeks[0]
+            counts = np.bincount(weeks - first_week, weights=self.counts[kind])
+            starts = (np.arange(counts.size) + first_week) * 7 + 1
+            return _to_datetime64(starts), counts.astype(np.int64)
+
+        return self._cached(("weekly", kind), compute)
+
+    def cumulative(self, kind="all", freq="daily"):
+        def compute():
+            dates, counts = getattr(self, freq)(kind)
+            return dates, np.cumsum(counts)
+
+        return self._cached(("cumulative", kind, freq), compute)
+
+    def rolling_mean(self, window, kind="all", freq="daily"):
+        # Trailing mean over `window` periods, NaN until the window is full
+        if window < 1:
+            raise ValueError(f"Rolling window must be at least 1 period: {window}")
+
+        def compute():
+            dates, counts = getattr(self, freq)(kind)
+            totals = np.concatenate(([0], np.cumsum(counts, dtype=np.float64)))
+            means = np.full(counts.size, np.nan)
+            if counts.size >= window:
+                means[window - 1 :] = (totals[window:] - totals[:-window]) / window
+            return dates, means
+
+        return self._cached(("rolling_mean", window, kind, freq), compute)
+
+    def split(self, freq="daily"):
+        # (dates, new, revision) counts per period
+        dates, new = getattr(self, freq)("new")
+        return dates, new, getattr(self, freq)("revision")[1]
+
+
+def default_root():
+    settings = get_project_settings()
+    return data_path(settings.get("COLUMNAR_STORE_DIR"))
+
+
+def load(archive, root=None, start=None, end=None, canonical_only=False):
+    """Load, or reuse, the `TimeSeries` of an archive between two optional dates.
+
+    With `canonical_only`, articles that duplicate one on another archive are left
+    out, so the series of several archives can be added up without counting a work
+    twice. Series are cached by the store's daily counts file modification time, so
+    a notebook picks up the articles of a new crawl without reloading the module.
+    """
+    root = root or default_root()
+    counts_path = os.path.join(root, archive, DAILY_COUNTS_FILE)
+    try:
+        modified = os.stat(counts_path).st_mtime_ns
+    except FileNotFoundError:
+        modified = None
+    key = (root, archive, start, end, canonical_only)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+
+    posted, is_revision, is_duplicate = ColumnarStore(root).load(archive, start, end)
+    posted = np.frombuffer(posted, dtype=np.int32)
+    is_revision = np.frombuffer(is_revision, dtype=np.uint8).astype(bool)
+    if canonical_only:
+        canonical = np.frombuffer(is_duplicate, dtype=np.uint8) == 0
+        posted, is_revision = posted[canonical], is_revision[canonical]
+    if start is not None or end is not None:
+        first = start.toordinal() if start else np.iinfo(np.int32).min
+        last = end.toordinal() if end else np.iinfo(np.int32).max
+        in_range = (posted >= first) & (posted <= last)
+        posted, is_revision = posted[in_range], is_revision[in_range]
+    series = TimeSeries(posted, is_revision)
+    _cache[key] = (modified, series)
+    return series
+
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _parse_periods(value):
+    periods = int(value)
+    if periods < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+    return periods
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print article counts per period from the time-series store."
+    )
+    parser.add_argument("archive", choices=ARCHIVES)
+    parser.add_argument("--root", help="store directory, the project's by default")
+    parser.add_argument("--freq", choices=("daily", "weekly"), default="daily")
+    parser.add_argument("--kind", choices=KINDS, default="all")
+    parser.add_argument("--cumulative", action="store_true")
+    parser.add_argument("--rolling", type=_parse_periods, metavar="PERIODS")
+    parser.add_argument("--split", action="store_true", help="new and revision counts")
+    parser.add_argument(
+        "--canonical",
+        action="store_true",
+        help="leave out duplicates of articles on other archives",
+    )
+    parser.add_argument("--start", type=_parse_date)
+    parser.add_argument("--end", type=_parse_date)
+    args = parser.parse_args(argv)
+
+    series = load(args.archive, args.root, args.start, args.end, args.canonical)
+    if args.split:
+        dates, *columns = series.split(args.freq)
+        header = ["date", "new", "revision"]
+    else:
+        dates, counts = getattr(series, args.freq)(args.kind)
+        columns, header = [counts], ["date", args.kind]
+        if args.cumulative:
+            columns.append(series.cumulative(args.kind, args.freq)[1])
+            header.append("cumulative")
+        if args.rolling:
+            columns.append(series.rolling_mean(args.rolling, args.kind, args.freq)[1])
+            header.append(f"rolling_mean_{args.rolling}")
+
+    out = sys.stdout
+    out.write(",".join(header) + "\n")
+    for date, *values in zip(dates.astype(str), *columns):
+        out.write(",".join([date] + [f"{value:g}" for value in values]) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from scrapy.utils.project import data_path
+
+
+def data_file_path(filename):
+    # Like `scrapy.utils.project.data_path`, but for a file rather than a directory:
+    # inside a project the file lives in the .scrapy data directory, which is created
+    # as needed.
+    path = data_path(filename)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
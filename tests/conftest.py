@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The Scrapy project lives in covid/scraper, its package is imported as `scraper`
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "covid", "scraper"))
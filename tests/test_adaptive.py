@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import scrapy
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from scraper.middlewares import AdaptiveConcurrencyMiddleware
+
+KEY = "www.medrxiv.org"
+URL = f"https://{KEY}/content/early/recent"
+SETTINGS = {
+    "DOWNLOAD_SLOTS": {KEY: {"concurrency": 4, "delay": 0.25}},
+    "ADAPTIVE_TARGET_LATENCY": 3.0,
+    "ADAPTIVE_MAX_DELAY": 60.0,
+}
+
+
+def adaptive_middleware(concurrency=4, delay=0.25):
+    crawler = get_crawler(scrapy.Spider, SETTINGS)
+    slot = SimpleNamespace(concurrency=concurrency, delay=delay)
+    downloader = SimpleNamespace(get_slot_key=lambda request: KEY, slots={KEY: slot})
+    crawler.engine = SimpleNamespace(downloader=downloader)
+    return AdaptiveConcurrencyMiddleware(crawler), slot
+
+
+def respond(mw, status=200, latency=0.5, headers=None):
+    request = Request(URL, meta={"download_latency": latency})
+    response = Response(URL, status=status, headers=headers, request=request)
+    return mw.process_response(request, response, None)
+
+
+def test_throttling_halves_concurrency_and_honours_retry_after():
+    mw, slot = adaptive_middleware()
+    respond(mw, status=503)
+    assert (slot.concurrency, slot.delay) == (2, 1.0)
+    respond(mw, status=429, headers={"Retry-After": "30"})
+    assert (slot.concurrency, slot.delay) == (1, 30.0)
+    respond(mw, status=429, headers={"Retry-After": "3600"})
+    assert (slot.concurrency, slot.delay) == (1, 60.0)
+    assert mw.stats.get_value(f"adaptive/{KEY}/throttled") == 3
+
+
+def test_slow_responses_give_up_concurrency_and_fast_ones_win_it_back():
+    mw, slot = adaptive_middleware()
+    respond(mw, latency=5.0)
+    respond(mw, latency=5.0)
+    assert slot.concurrency == 2
+    slot.delay = 2.0
+    # A full round of fast responses per request won back, up to the budget
+    respond(mw)
+    assert (slot.concurrency, slot.delay) == (2, 2.0)
+    respond(mw)
+    assert (slot.concurrency, slot.delay) == (3, 1.0)
+    for _ in range(3 + 4 + 4):
+        respond(mw)
+    assert (slot.concurrency, slot.delay) == (4, 0.25)
+
+
+def test_cached_responses_are_ignored():
+    mw, slot = adaptive_middleware()
+    request = Request(URL, meta={"download_latency": 10.0})
+    mw.process_response(request, Response(URL, flags=["cached"]), None)
+    assert slot.concurrency == 4
+    assert mw._retry_after(Response(URL, headers={"Retry-After": "soon"})) == 0.0
@@ -0,0 +1,61 @@
+import datetime
+import multiprocessing
+
+from scraper.bookmarks import BookmarkStore
+from scraper.spiders.chem_archive import ChemRXIVSpider
+
+
+def test_bookmark_store_round_trip(tmp_path):
+    store = BookmarkStore(str(tmp_path / "bookmarks.json"))
+    assert store.get("medrxiv") is None
+    store.set("medrxiv", datetime.datetime(2020, 3, 13, 17, 24))
+    assert store.get("medrxiv") == datetime.datetime(2020, 3, 13)
+    assert store.get("biorxiv") is None
+
+
+def test_bookmark_store_never_moves_backwards(tmp_path):
+    store = BookmarkStore(str(tmp_path / "bookmarks.json"))
+    store.set("chemrxiv", datetime.datetime(2020, 3, 13))
+    store.set("chemrxiv", datetime.datetime(2020, 2, 1))
+    assert store.get("chemrxiv") == datetime.datetime(2020, 3, 13)
+
+
+def set_bookmarks(path, name):
+    store = BookmarkStore(path)
+    for day in range(1, 29):
+        store.set(name, datetime.datetime(2020, 2, day))
+
+
+def test_bookmark_store_is_shared_by_processes(tmp_path):
+    path = str(tmp_path / "bookmarks.json")
+    names = ["medrxiv", "biorxiv", "chemrxiv", "chinaxiv"]
+    processes = [
+        multiprocessing.Process(target=set_bookmarks, args=(path, name))
+        for name in names
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    store = BookmarkStore(path)
+    assert [store.get(name) for name in names] == [datetime.datetime(2020, 2, 28)] * 4
+
+
+def test_bookmark_only_moves_after_complete_paging(tmp_path):
+    spider = ChemRXIVSpider()
+    spider.bookmark_store = BookmarkStore(str(tmp_path / "bookmarks.json"))
+    spider.high_water_mark = datetime.datetime(2020, 3, 13)
+
+    spider._save_bookmark(spider, "finished")
+    assert spider.bookmark_store.get("chemrxiv") is None
+
+    spider._complete_paging()
+    spider.paging_failed = True
+    spider._save_bookmark(spider, "finished")
+    assert spider.bookmark_store.get("chemrxiv") is None
+
+    spider.paging_failed = False
+    spider._save_bookmark(spider, "shutdown")
+    assert spider.bookmark_store.get("chemrxiv") is None
+    spider._save_bookmark(spider, "finished")
+    assert spider.bookmark_store.get("chemrxiv") == datetime.datetime(2020, 3, 13)
@@ -0,0 +1,47 @@
+import datetime
+import time
+
+from scraper.cache import PostedDateCache
+
+
+def make_cache(tmp_path, **kwargs):
+    options = dict(ttl=100, negative_ttl=10, max_entries=100)
+    options.update(kwargs)
+    return PostedDateCache(str(tmp_path / "cache.sqlite"), **options)
+
+
+def test_posted_date_cache_hit_and_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("10.1101/a") == (False, None)
+    cache.set("10.1101/a", datetime.datetime(2020, 3, 13))
+    cache.set("10.1101/b", None)
+    assert cache.get("10.1101/a") == (True, datetime.datetime(2020, 3, 13))
+    assert cache.get("10.1101/b") == (True, None)
+    assert cache.stats() == {"hits": 1, "negative_hits": 1, "misses": 1}
+
+
+def test_posted_date_cache_persists(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("10.1101/a", datetime.datetime(2020, 3, 13))
+    cache.close()
+    cache = make_cache(tmp_path)
+    assert cache.get("10.1101/a") == (True, datetime.datetime(2020, 3, 13))
+
+
+def test_posted_date_cache_negative_results_expire_sooner(tmp_path):
+    cache = make_cache(tmp_path, negative_ttl=-1)
+    cache.set("10.1101/a", datetime.datetime(2020, 3, 13))
+    cache.set("10.1101/b", None)
+    assert cache.get("10.1101/a")[0]
+    assert cache.get("10.1101/b") == (False, None)
+
+
+def test_posted_date_cache_evicts_by_size(tmp_path, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    cache = make_cache(tmp_path, max_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.set(key, datetime.datetime(2020, 3, 13))
+    cache.evict()
+    assert not cache.get("a")[0]
+    assert cache.get("c")[0]
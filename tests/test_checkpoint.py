@@ -0,0 +1,41 @@
+from scraper.checkpoint import Checkpoint
+
+
+def test_checkpoint_pops_by_priority_and_skips_known_requests(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "medrxiv.sqlite"))
+    assert checkpoint.resume() == 0
+    assert checkpoint.push("article", 0, {"url": "https://example.org/1v2"})
+    assert checkpoint.push("listing", 20, {"url": "https://example.org/?page=1"})
+    assert not checkpoint.push("article", 0, {"url": "https://example.org/1v2"})
+
+    (listing_id, listing), (article_id, article) = checkpoint.pop(10)
+    assert listing["url"].endswith("page=1")
+    assert article["url"].endswith("1v2")
+    assert checkpoint.pop(10) == []
+
+    checkpoint.complete(listing_id)
+    checkpoint.save_state({"high_water_mark": None, "_probed_pages": {0, 1}})
+    checkpoint.commit()
+    assert not checkpoint.push("listing", 20, {"url": "https://example.org/?page=1"})
+    checkpoint.close()
+
+    # A restart hands out the request that was never done, and nothing else
+    checkpoint = Checkpoint(str(tmp_path / "medrxiv.sqlite"))
+    assert checkpoint.resume() == 1
+    assert checkpoint.pop(10) == [(article_id, article)]
+    assert checkpoint.load_state()["_probed_pages"] == {0, 1}
+    checkpoint.close(delete=True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_checkpoint_loses_uncommitted_changes(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "chinaxiv.sqlite"))
+    checkpoint.push("listing", 20, {"url": "https://example.org/?token=a"})
+    checkpoint.commit()
+    [(request_id, _request)] = checkpoint.pop(10)
+    checkpoint.complete(request_id)
+    checkpoint.connection.close()
+
+    checkpoint = Checkpoint(str(tmp_path / "chinaxiv.sqlite"))
+    assert checkpoint.resume() == 1
+    checkpoint.close()
@@ -0,0 +1,69 @@
+import os
+import datetime
+
+from scrapy.http import Request, XmlResponse
+from scrapy.utils.test import get_crawler
+
+from scraper.items import ArticleItem
+from scraper.spiders.china_archive import ChinaXIVSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "chinaxiv_records.xml")
+URL = ChinaXIVSpider.start_urls[0]
+
+
+def parse_fixture(spider):
+    spider.crawler = get_crawler(ChinaXIVSpider)
+    with open(FIXTURE, "rb") as f:
+        response = XmlResponse(URL, body=f.read(), request=Request(URL))
+    return list(spider.parse(response))
+
+
+def test_metadata_mode_dates_records_without_article_pages():
+    spider = ChinaXIVSpider()
+    outputs = parse_fixture(spider)
+    items = {output.id: output for output in outputs if isinstance(output, ArticleItem)}
+
+    # The version element says it is a revision, `createtime` is the V1 date
+    revised = items["chinaxiv_202003.00011"]
+    assert revised.posted_date == datetime.date(2020, 3, 2)
+    assert revised.is_revision is True
+    # No version, but not modified since the day it was created
+    new = items["chinaxiv_202003.00012"]
+    assert new.posted_date == datetime.date(2020, 3, 17)
+    assert new.is_revision is False
+
+    # Modified since, or without a usable `createtime`, needs the article page
+    requests = [output for output in outputs if isinstance(output, Request)]
+    assert [request.cb_kwargs["data"].id for request in requests] == [
+        "chinaxiv_202003.00013",
+        "chinaxiv_202003.00014",
+    ]
+    assert all(request.callback == spider.parse_article_page for request in requests)
+    assert all(request.cb_kwargs["data"].posted is None for request in requests)
+
+    stats = spider.crawler.stats
+    assert stats.get_value("chinaxiv/metadata_resolved") == 2
+    assert stats.get_value("chinaxiv/html_fetches") == 2
+    # The undated record does not move the high-water mark, nor stop paging
+    assert spider.high_water_mark == datetime.datetime(2020, 3, 17, 10, 30)
+    assert spider.paging_complete
+
+
+def test_html_mode_always_fetches_the_article_page():
+    outputs = parse_fixture(ChinaXIVSpider(harvest_mode="html"))
+    assert len(outputs) == 4
+    assert all(isinstance(output, Request) for output in outputs)
+
+
+def test_fingerprint_is_built_from_datestamp_and_version():
+    outputs = parse_fixture(ChinaXIVSpider())
+    items = [output for output in outputs if isinstance(output, ArticleItem)]
+    data = [request.cb_kwargs["data"] for request in outputs if request not in items]
+    fingerprints = {article.id: article.fingerprint for article in items + data}
+    url = "http://www.chinaxiv.org/abs/"
+    assert fingerprints == {
+        "chinaxiv_202003.00011": url + "202003.00011@2020-03-18T08:00:00Z/v2",
+        "chinaxiv_202003.00012": url + "202003.00012@2020-03-17T16:00:00Z/",
+        "chinaxiv_202003.00013": url + "202003.00013@2020-03-19T11:00:00Z/",
+        "chinaxiv_202003.00014": url + "202003.00014@2020-03-16/",
+    }
@@ -0,0 +1,48 @@
+import os
+import datetime
+
+from scraper.columnar import IS_DUPLICATE_FILE, ColumnarStore
+from scraper.timeseries import load
+
+
+def test_columnar_store_round_trip(tmp_path):
+    store = ColumnarStore(str(tmp_path))
+    march, april = datetime.date(2020, 3, 31), datetime.date(2020, 4, 1)
+    assert store.append("medrxiv", "a", march.toordinal(), False)
+    assert store.append("medrxiv", "b", april.toordinal(), True)
+    assert not store.append("medrxiv", "a", april.toordinal(), False)
+    store.flush()
+
+    reopened = ColumnarStore(str(tmp_path))
+    assert not reopened.append("medrxiv", "b", april.toordinal(), True)
+    posted, flags, duplicates = reopened.load("medrxiv")
+    assert list(posted) == [march.toordinal(), april.toordinal()]
+    assert list(flags) == [0, 1] and list(duplicates) == [0, 0]
+    posted, _flags, _duplicates = reopened.load("medrxiv", start=april, end=april)
+    assert list(posted) == [april.toordinal()]
+    assert reopened.daily_counts("medrxiv") == {
+        "2020-03-31": [1, 0],
+        "2020-04-01": [0, 1],
+    }
+
+
+def test_columnar_store_flags_duplicates(tmp_path):
+    store = ColumnarStore(str(tmp_path))
+    march = datetime.date(2020, 3, 31).toordinal()
+    store.append("biorxiv", "a", march, False)
+    store.flush()
+    # A partition written before the duplicate column existed
+    os.remove(tmp_path / "biorxiv" / "2020-03" / IS_DUPLICATE_FILE)
+
+    store.append("biorxiv", "b", march + 1, False, is_duplicate=True)
+    store.append("biorxiv", "c", march, True)
+    store.flush()
+    posted, flags, duplicates = store.load("biorxiv")
+    assert list(posted) == [march, march, march + 1]
+    assert list(flags) == [0, 1, 0] and list(duplicates) == [0, 0, 1]
+
+    series = load("biorxiv", str(tmp_path), canonical_only=True)
+    assert len(series) == 2 and len(load("biorxiv", str(tmp_path))) == 3
+    assert list(series.daily("new")[1]) == [1] and list(
+        series.daily("revision")[1]
+    ) == [1]
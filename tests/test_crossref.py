@@ -0,0 +1,85 @@
+import os
+import datetime
+
+from scrapy.http import Request, TextResponse
+from twisted.internet.error import TimeoutError
+from twisted.python.failure import Failure
+
+from scraper.items import ArticleItem
+from scraper.spiders.bio_med_archives import MedRXIVSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "crossref_works.json")
+
+
+def revision(doi):
+    data = ArticleItem(doi=doi, url=f"https://www.medrxiv.org/content/{doi}v2")
+    data.is_revision = True
+    return data
+
+
+def pending_revisions():
+    # The third is not in the batch's results, and Crossref has no date for the last
+    return [
+        revision("10.1101/2020.02.11.20022053"),
+        revision("10.1101/2020.02.20.20025866"),
+        revision("10.1101/2020.02.28.20029017"),
+        revision("10.1101/869495"),
+    ]
+
+
+def test_crossref_request_batches_the_pending_dois():
+    spider = MedRXIVSpider()
+    pending = pending_revisions()
+    request = spider._request_crossref(pending)
+    assert request.url.startswith("https://api.crossref.org/works?filter=doi")
+    assert "doi%3A10.1101%2F869495" in request.url
+    assert request.meta["download_slot"] == "api.crossref.org"
+    assert request.cb_kwargs["pending"] is pending
+    batches = list(spider._batch_pending(list(range(45))))
+    assert [len(batch) for batch in batches] == [20, 20, 5]
+
+
+def test_crossref_dates_fan_out_to_the_pending_items():
+    spider = MedRXIVSpider()
+    pending = pending_revisions()
+    request = spider._request_crossref(pending)
+    with open(FIXTURE, "rb") as f:
+        response = TextResponse(
+            request.url, body=f.read(), encoding="utf-8", request=request
+        )
+    outputs = list(spider.parse_crossref(response, pending))
+
+    dated = [output for output in outputs if isinstance(output, ArticleItem)]
+    assert [(data.doi, data.posted_date) for data in dated] == [
+        ("10.1101/2020.02.11.20022053", datetime.date(2020, 2, 13)),
+        ("10.1101/2020.02.20.20025866", datetime.date(2020, 2, 22)),
+    ]
+    # Anything the batch missed falls back to its article info page
+    fallbacks = [output for output in outputs if isinstance(output, Request)]
+    assert [request.url for request in fallbacks] == [
+        "https://www.medrxiv.org/content/10.1101/2020.02.28.20029017v2.article-info",
+        "https://www.medrxiv.org/content/10.1101/869495v2.article-info",
+    ]
+    assert all(request.cb_kwargs["data"].posted is None for request in fallbacks)
+
+
+def test_crossref_bad_response_falls_back_per_item():
+    spider = MedRXIVSpider()
+    pending = pending_revisions()
+    request = spider._request_crossref(pending)
+    response = TextResponse(
+        request.url, body=b"<html>Busy</html>", encoding="utf-8", request=request
+    )
+    outputs = list(spider.parse_crossref(response, pending))
+    assert [output.cb_kwargs["data"] for output in outputs] == pending
+
+
+def test_failed_crossref_batch_falls_back_per_item():
+    spider = MedRXIVSpider()
+    pending = pending_revisions()
+    failure = Failure(TimeoutError())
+    failure.request = spider._request_crossref(pending)
+    outputs = list(spider.crossref_failed(failure))
+    assert all(output.callback == spider.parse_article_page for output in outputs)
+    assert [output.cb_kwargs["data"] for output in outputs] == pending
+    assert all(output.meta["cache_immutable"] for output in outputs)
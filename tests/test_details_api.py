@@ -0,0 +1,100 @@
+import os
+import json
+import datetime
+
+from scrapy.http import Request, TextResponse
+
+from scraper.cache import PostedDateCache
+from scraper.items import ArticleItem
+from scraper.spiders.bio_med_archives import MedRXIVSpider
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "medrxiv_details.json")
+
+
+def details_response(url, body):
+    return TextResponse(url, body=body, encoding="utf-8", request=Request(url))
+
+
+def parse_fixture(spider, body=None):
+    if body is None:
+        with open(FIXTURE, "rb") as f:
+            body = f.read()
+    url = "https://api.biorxiv.org/details/medrxiv/2020-03-01/2020-03-07/0"
+    response = details_response(url, body)
+    return list(spider.parse_details(response, "2020-03-01", "2020-03-07", 0))
+
+
+def test_details_windows_cover_bookmark_to_today():
+    spider = MedRXIVSpider(source="api")
+    spider.bookmark_date = datetime.datetime(2020, 3, 1)
+    requests = list(spider._request_details_windows(today=datetime.date(2020, 3, 16)))
+    assert [request.url for request in requests] == [
+        "https://api.biorxiv.org/details/medrxiv/2020-03-02/2020-03-08/0",
+        "https://api.biorxiv.org/details/medrxiv/2020-03-09/2020-03-15/0",
+        "https://api.biorxiv.org/details/medrxiv/2020-03-16/2020-03-16/0",
+    ]
+
+
+def test_details_emit_one_item_per_article():
+    output = parse_fixture(MedRXIVSpider(source="api"))
+    items = [item for item in output if isinstance(item, ArticleItem)]
+    by_id = {item.id: item for item in items}
+    assert len(items) == len(by_id) == 2
+
+    revised = by_id["medrxiv_2020.03.02.20029983"]
+    assert (
+        revised.title == "Estimating the infection fatality ratio of COVID-19 in Wuhan"
+    )
+    assert (
+        revised.url == "https://www.medrxiv.org/content/10.1101/2020.03.02.20029983v2"
+    )
+    assert revised.is_revision is True
+    assert revised.posted_date == datetime.date(2020, 3, 2)
+
+    new = by_id["medrxiv_2020.03.03.20030593"]
+    assert new.is_revision is False
+    assert new.posted_date == datetime.date(2020, 3, 3)
+
+    # Its first version is older than the window, and there is no cache, so its
+    # posted date is looked up with Crossref
+    [request] = [item for item in output if isinstance(item, Request)]
+    assert request.callback.__name__ == "parse_crossref"
+    [older] = request.cb_kwargs["pending"]
+    assert older.id == "medrxiv_2020.02.11.20022053"
+    assert older.is_revision is True and older.posted is None
+
+
+def details_spider_with_cache(tmp_path, doi, date):
+    spider = MedRXIVSpider(source="api")
+    spider.posted_date_cache = PostedDateCache(
+        str(tmp_path / "posted_dates.sqlite"), 3600, 3600, 100
+    )
+    spider.posted_date_cache.set(doi, date)
+    return spider
+
+
+def test_details_take_cached_posted_dates(tmp_path):
+    doi = "10.1101/2020.02.11.20022053"
+    spider = details_spider_with_cache(tmp_path, doi, datetime.datetime(2020, 2, 13))
+    by_id = {item.id: item for item in parse_fixture(spider)}
+    assert len(by_id) == 3
+    older = by_id["medrxiv_2020.02.11.20022053"]
+    assert older.posted_date == datetime.date(2020, 2, 13)
+
+    # A cached Crossref miss goes straight to the article info page
+    spider = details_spider_with_cache(tmp_path, doi, None)
+    [request] = [item for item in parse_fixture(spider) if isinstance(item, Request)]
+    assert request.callback == spider.parse_article_page
+    assert request.cb_kwargs["data"].id == "medrxiv_2020.02.11.20022053"
+
+
+def test_details_follow_the_cursor_before_emitting():
+    with open(FIXTURE) as f:
+        details = json.load(f)
+    details["messages"][0]["total"] = "10"
+    spider = MedRXIVSpider(source="api")
+    output = parse_fixture(spider, json.dumps(details).encode("utf-8"))
+    assert len(output) == 1
+    assert isinstance(output[0], Request)
+    assert output[0].url.endswith("/2020-03-01/2020-03-07/4")
+    assert output[0].cb_kwargs == dict(start="2020-03-01", end="2020-03-07", cursor=4)
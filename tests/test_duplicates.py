@@ -0,0 +1,52 @@
+import sqlite3
+
+from scraper.duplicates import DuplicateIndex, minhash, similarity
+
+TITLE = "Estimating the infection fatality ratio of COVID-19 in Wuhan"
+
+
+def open_index(tmp_path):
+    return DuplicateIndex(str(tmp_path / "duplicates.sqlite"), threshold=0.7)
+
+
+def test_minhash_estimates_title_similarity():
+    same = similarity(minhash(TITLE), minhash(TITLE.upper() + "."))
+    other = similarity(minhash(TITLE), minhash("Lockdown and air quality in Delhi"))
+    assert same == 1.0
+    assert other < 0.2
+
+
+def test_duplicate_index_clusters_across_archives(tmp_path):
+    index = open_index(tmp_path)
+    assert index.cluster("medrxiv_1", TITLE) == "medrxiv_1"
+    assert index.cluster("chemrxiv_7", TITLE.replace("COVID-19", "COVID19")) == (
+        "medrxiv_1"
+    )
+    # Similar titles on the same archive are different articles
+    assert index.cluster("medrxiv_2", TITLE) == "medrxiv_2"
+    assert index.cluster("chinaxiv_3", "Lockdown and air quality in Delhi") == (
+        "chinaxiv_3"
+    )
+    assert index.cluster("biorxiv_4", None) == "biorxiv_4"
+    index.close()
+
+    # Indexed articles keep their cluster
+    index = open_index(tmp_path)
+    assert index.cluster("chemrxiv_7", "A revised title") == "medrxiv_1"
+    assert index.cluster("biorxiv_8", "Lockdown and air quality in Delhi.") == (
+        "chinaxiv_3"
+    )
+    index.close()
+
+
+def test_duplicate_index_leaves_no_write_transaction_open(tmp_path):
+    index = open_index(tmp_path)
+    assert index.cluster("medrxiv_1", TITLE) == "medrxiv_1"
+
+    # Another process sharing the index can write, and sees the article
+    other = sqlite3.connect(str(tmp_path / "duplicates.sqlite"), timeout=0)
+    other.execute("BEGIN IMMEDIATE")
+    assert other.execute("SELECT cluster FROM articles").fetchall() == [("medrxiv_1",)]
+    other.rollback()
+    other.close()
+    index.close()
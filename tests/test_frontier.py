@@ -0,0 +1,104 @@
+import datetime
+
+from scraper.bookmarks import BookmarkStore
+from scraper.frontier import Frontier
+from scraper.spiders.bio_med_archives import MedRXIVSpider
+from scraper.spiders.china_archive import ChinaXIVSpider
+
+REQUEST = {"url": "https://www.chinaxiv.org/abs/202003.00001"}
+
+
+def test_frontier_leases_each_job_once(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), 300, 3)
+    assert frontier.enqueue("chinaxiv", "a", REQUEST)
+    assert not frontier.enqueue("chinaxiv", "a", REQUEST)
+    assert frontier.enqueue("chinaxiv", "b", REQUEST)
+
+    [(first_id, request), _second] = frontier.lease("chinaxiv", "worker-1", 10)
+    assert request == REQUEST
+    assert frontier.lease("chinaxiv", "worker-2", 10) == []
+    # A leased job is still live, so the same request is not queued twice
+    assert not frontier.enqueue("chinaxiv", "a", REQUEST)
+    assert frontier.pending("chinaxiv") == 2
+
+    frontier.complete(first_id)
+    assert frontier.pending("chinaxiv") == 1
+    # A job that is done no longer blocks the same request in a later run
+    assert frontier.enqueue("chinaxiv", "a", REQUEST)
+    frontier.close()
+
+
+def test_expired_leases_are_leased_again_until_exhausted(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), -1, 2)
+    frontier.enqueue("chinaxiv", "a", REQUEST)
+    [(job_id, _request)] = frontier.lease("chinaxiv", "worker-1", 10)
+    assert frontier.fail_exhausted("chinaxiv") == 0
+    # The worker died, its lease expired and another worker takes the job over
+    assert frontier.lease("chinaxiv", "worker-2", 10) == [(job_id, REQUEST)]
+    assert frontier.lease("chinaxiv", "worker-3", 10) == []
+
+    assert frontier.fail_exhausted("chinaxiv") == 1
+    assert frontier.pending("chinaxiv") == 0
+    assert frontier.enqueue("chinaxiv", "a", REQUEST)
+    frontier.close()
+
+
+def test_leader_release_purges_finished_jobs(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), 300, 3)
+    assert frontier.claim_leader("chinaxiv", "leader-1")
+    assert not frontier.claim_leader("chinaxiv", "leader-2")
+    frontier.enqueue("chinaxiv", "a", REQUEST)
+    frontier.enqueue("chinaxiv", "b", REQUEST)
+    [(job_id, _request), _other] = frontier.lease("chinaxiv", "worker-1", 10)
+    frontier.complete(job_id)
+
+    frontier.release_leader("chinaxiv", "leader-1")
+    assert not frontier.has_leader("chinaxiv")
+    (count,) = frontier.connection.execute("SELECT COUNT(*) FROM jobs").fetchone()
+    assert count == 1 and frontier.pending("chinaxiv") == 1
+    frontier.close()
+
+
+def leader(tmp_path, spider_cls=ChinaXIVSpider, role="leader"):
+    spider = spider_cls(role=role)
+    spider.frontier = Frontier(str(tmp_path / "frontier.sqlite"), 300, 3)
+    spider.frontier_owner = "host:1"
+    return spider
+
+
+def test_restarted_leader_resumes_from_its_cursor(tmp_path):
+    spider = leader(tmp_path)
+    [request] = spider.start_requests()
+    assert request.url == ChinaXIVSpider.start_urls[0]
+    spider._save_frontier_cursor("token-2")
+    # The leader crashed, without closing, and a new one takes over once it expires
+    spider.frontier.connection.execute("UPDATE leaders SET expires = 0")
+
+    spider = leader(tmp_path)
+    [request] = spider.start_requests()
+    assert request.url.endswith("verb=ListRecords&resumptionToken=token-2")
+    assert request.errback == spider.listing_failed
+
+    # Paging is done, so the next leader starts from the first page again
+    spider.paging_complete = True
+    spider._close_frontier(spider)
+    spider = leader(tmp_path)
+    [request] = spider.start_requests()
+    assert request.url == ChinaXIVSpider.start_urls[0]
+
+
+def test_leader_without_a_cursor_url_starts_over(tmp_path):
+    spider = leader(tmp_path, MedRXIVSpider)
+    spider.frontier.claim_leader("medrxiv", "host:1")
+    spider.frontier.save_cursor("medrxiv", "host:1", "3")
+    [request] = spider.start_requests()
+    assert request.url == MedRXIVSpider.start_urls[0]
+
+
+def test_workers_leave_the_bookmark_alone(tmp_path, caplog):
+    spider = leader(tmp_path, role="worker")
+    spider.bookmark_store = BookmarkStore(str(tmp_path / "bookmarks.json"))
+    spider.high_water_mark = datetime.datetime(2020, 3, 13)
+    spider._save_bookmark(spider, "finished")
+    assert "bookmark not saved" not in caplog.text
+    assert spider.bookmark_store.get("chinaxiv") is None
@@ -0,0 +1,93 @@
+import os
+
+import scrapy
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+
+from scraper.httpstore import ResponseStore
+from scraper.middlewares import ScraperDownloaderMiddleware
+
+URL = "https://www.medrxiv.org/content/10.1101/2020.03.01.20029421v1"
+BODY = b"<html><body>An article</body></html>"
+HEADERS = {"ETag": '"abc"', "Last-Modified": "Sun, 01 Mar 2020 00:00:00 GMT"}
+
+
+def page(url=URL, body=BODY, status=200):
+    return HtmlResponse(url, status=status, headers=HEADERS, body=body)
+
+
+def test_response_store_round_trip(tmp_path):
+    store = ResponseStore(str(tmp_path))
+    assert store.get("a") is None
+    assert store.put("a", page()) > 0
+    # Bodies are stored by content, once
+    assert store.put("b", page(URL + "?copy")) == 0
+
+    cached = store.get("a")
+    assert (cached.url, cached.status, cached.etag) == (URL, 200, '"abc"')
+    assert cached.last_modified == HEADERS["Last-Modified"]
+    request = Request(URL)
+    response = store.build_response(cached, request)
+    assert isinstance(response, HtmlResponse)
+    assert response.body == BODY and response.request is request
+    assert "cached" in response.flags
+
+    os.remove(store._body_path(cached.body_hash))
+    assert store.build_response(cached, request) is None
+    store.close()
+
+
+def middleware(tmp_path):
+    crawler = get_crawler(scrapy.Spider)
+    spider = scrapy.Spider("medrxiv")
+    return ScraperDownloaderMiddleware(ResponseStore(str(tmp_path)), crawler), spider
+
+
+def test_immutable_pages_are_answered_from_the_store(tmp_path):
+    mw, spider = middleware(tmp_path)
+    request = Request(URL, meta={"cache_immutable": True})
+    assert mw.process_request(request, spider) is None
+    assert mw.process_response(request, page(), spider).body == BODY
+
+    response = mw.process_request(Request(URL, meta={"cache_immutable": True}), spider)
+    assert response.body == BODY and "cached" in response.flags
+    assert mw.stats.get_value("httpstore/hit") == 1
+
+
+def test_not_modified_is_answered_from_the_store(tmp_path):
+    mw, spider = middleware(tmp_path)
+    request = Request(URL)
+    mw.process_response(request, page(), spider)
+
+    request = Request(URL)
+    assert mw.process_request(request, spider) is None
+    assert request.headers["If-None-Match"] == b'"abc"'
+    assert request.headers["If-Modified-Since"] == HEADERS["Last-Modified"].encode()
+    not_modified = Response(URL, status=304, request=request)
+    response = mw.process_response(request, not_modified, spider)
+    assert response.status == 200 and response.body == BODY
+    assert mw.stats.get_value("httpstore/not_modified") == 1
+
+
+def test_not_modified_without_a_stored_body_is_fetched_again(tmp_path):
+    mw, spider = middleware(tmp_path)
+    mw.process_response(Request(URL), page(), spider)
+    cached = mw.store.get(mw._fingerprint(Request(URL)))
+    os.remove(mw.store._body_path(cached.body_hash))
+
+    request = Request(URL, meta={"cache_immutable": True})
+    assert mw.process_request(request, spider) is None
+    assert "If-None-Match" in request.headers
+    not_modified = Response(URL, status=304, request=request)
+    refetch = mw.process_response(request, not_modified, spider)
+    assert isinstance(refetch, Request) and refetch.dont_filter
+    assert "If-None-Match" not in refetch.headers
+    assert "If-Modified-Since" not in refetch.headers
+    assert mw.stats.get_value("httpstore/refetch") == 1
+
+    # Sent again as is, and its response stored again
+    assert mw.process_request(refetch, spider) is None
+    assert "If-None-Match" not in refetch.headers
+    assert mw.process_response(refetch, page(), spider).body == BODY
+    stored = mw.store.get(mw._fingerprint(refetch))
+    assert mw.store.build_response(stored, refetch).body == BODY
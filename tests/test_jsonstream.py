@@ -0,0 +1,90 @@
+import json
+
+from scrapy.http import Request, TextResponse
+
+from scraper.bookmarks import parse_bookmark
+from scraper.jsonstream import iter_members
+from scraper.spiders import chem_archive
+from scraper.spiders.chem_archive import ChemRXIVSpider
+
+DOCUMENT = {
+    "cursor": "abc",
+    "items": [{"id": i, "title": f'[{i}] "quoted" {{x}}'} for i in range(10)],
+    "totalCount": 10,
+}
+TEXT = json.dumps(DOCUMENT, indent=1)
+
+
+def test_iter_members_matches_json_loads():
+    assert dict(iter_members(TEXT)) == DOCUMENT
+    assert dict(iter_members("{}")) == {}
+    members = iter_members(TEXT, lazy_keys=("items",))
+    assert [list(value) for key, value in members if key == "items"] == [
+        DOCUMENT["items"]
+    ]
+
+
+def test_iter_members_skips_unread_elements():
+    members = []
+    for key, value in iter_members(TEXT, lazy_keys=("items",)):
+        if key == "items":
+            value = [element for element, _ in zip(value, range(3))]
+        members.append((key, value))
+    assert members == [
+        ("cursor", "abc"),
+        ("items", DOCUMENT["items"][:3]),
+        ("totalCount", 10),
+    ]
+
+
+def chemrxiv_response(dates, latency=None, tail=""):
+    items = [
+        {
+            "data": {
+                "id": i,
+                "title": "COVID-19",
+                "publicUrl": f"https://chemrxiv.org/{i}",
+                "publishedDate": date,
+                "timeline": {"posted": date},
+                "version": 1,
+            }
+        }
+        for i, date in enumerate(dates)
+    ]
+    url = "https://chemrxiv.org/api/institutions/259/items"
+    request = Request(url, meta={"download_latency": latency})
+    body = json.dumps({"cursor": "next", "items": items})[:-1] + tail + "}"
+    return TextResponse(url, body=body.encode(), encoding="utf-8", request=request)
+
+
+def test_chemrxiv_stops_at_the_bookmark():
+    spider = ChemRXIVSpider()
+    spider.bookmark_date = parse_bookmark("2020-03-10")
+    dates = ["2020-03-12T00:00:00Z", "2020-03-11T00:00:00Z"]
+    dates += ["2020-03-09T00:00:00Z"] * 5
+    # Once past the bookmark, with the cursor read, the rest is never decoded
+    response = chemrxiv_response(dates, tail=', "totalCount": not json')
+    outputs = list(spider.parse(response))
+    assert [output.id for output in outputs] == ["chemrxiv_0", "chemrxiv_1"]
+    assert spider.paging_complete
+
+
+def test_chemrxiv_page_size_adapts_to_latency():
+    spider = ChemRXIVSpider()
+    target = chem_archive.PAGE_TARGET_LATENCY
+    assert spider._adapt_page_size(chemrxiv_response([])) == 40
+    assert spider._adapt_page_size(chemrxiv_response([], target / 4)) == 80
+    assert spider._adapt_page_size(chemrxiv_response([], target * 0.75)) == 40
+    assert spider._adapt_page_size(chemrxiv_response([], target * 2)) == 20
+
+    spider.page_size = chem_archive.PAGE_SIZE_MAX
+    assert spider._adapt_page_size(chemrxiv_response([], 0)) == 320
+    spider.page_size = chem_archive.PAGE_SIZE_MIN
+    assert spider._adapt_page_size(chemrxiv_response([], target * 2)) == 20
+
+
+def test_chemrxiv_empty_final_page_completes_paging():
+    spider = ChemRXIVSpider()
+    spider.bookmark_date = parse_bookmark("2020-03-10")
+    assert list(spider.parse(chemrxiv_response([]))) == []
+    assert spider.paging_complete and not spider.paging_failed
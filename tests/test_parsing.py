@@ -0,0 +1,61 @@
+import os
+import pickle
+import asyncio
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from scraper.parsing import EXTRACTED_META, ParserPool
+from scraper.spiders.bio_med_archives import MedRXIVSpider, extract_listing_page
+from scraper.spiders.china_archive import ChinaXIVSpider, extract_oai_page
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures")
+
+
+def fixture_response(response_cls, filename, url):
+    with open(os.path.join(FIXTURES, filename), "rb") as f:
+        body = f.read()
+    return response_cls(url, body=body, encoding="utf-8", request=Request(url))
+
+
+def items_of(outputs):
+    return [repr(output) for output in outputs if not isinstance(output, Request)]
+
+
+def test_extracted_listing_page_parses_like_the_response():
+    url = "https://www.medrxiv.org/content/early/recent?page=0"
+    inline = fixture_response(HtmlResponse, "medrxiv_listing.html", url)
+    pooled = fixture_response(HtmlResponse, "medrxiv_listing.html", url)
+    extracted = extract_listing_page(pooled.body, pooled.encoding)
+    pooled.meta[EXTRACTED_META] = pickle.loads(pickle.dumps(extracted))
+
+    spider = MedRXIVSpider(relevance="all")
+    inline_outputs = list(spider.parse(inline))
+    pooled_outputs = list(MedRXIVSpider(relevance="all").parse(pooled))
+    assert items_of(pooled_outputs) == items_of(inline_outputs)
+    assert [o.url for o in pooled_outputs if isinstance(o, Request)] == [
+        o.url for o in inline_outputs if isinstance(o, Request)
+    ]
+
+
+def test_extracted_oai_page_matches_the_streaming_parse():
+    with open(os.path.join(FIXTURES, "chinaxiv_oai.xml"), "rb") as f:
+        body = f.read()
+    entries = extract_oai_page(body)
+    assert entries == list(ChinaXIVSpider()._iter_oai_page(body))
+    assert [kind for kind, _value in entries].count("cursor") == 1
+    assert pickle.loads(pickle.dumps(entries)) == entries
+
+
+def test_parser_pool_runs_extractors_in_workers():
+    with open(os.path.join(FIXTURES, "chinaxiv_oai.xml"), "rb") as f:
+        body = f.read()
+    pool = ParserPool.from_settings(Settings({"PARSER_POOL_WORKERS": 1}))
+    assert ParserPool.from_settings(Settings()) is pool
+    try:
+        entries = asyncio.run(pool.run(extract_oai_page, body, "utf-8"))
+    finally:
+        pool.close()
+        pool.close()
+    assert ParserPool._open is None
+    assert entries == extract_oai_page(body)
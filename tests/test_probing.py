@@ -0,0 +1,62 @@
+from scrapy.http import HtmlResponse, Request
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TimeoutError
+from twisted.python.failure import Failure
+
+from scraper.spiders.bio_med_archives import MedRXIVSpider
+
+
+def fanout_spider():
+    spider = MedRXIVSpider(paging="fanout")
+    spider.crawler = get_crawler(MedRXIVSpider)
+    return spider
+
+
+def probe_failure(spider, page, error):
+    request = Request(spider._make_listing_url(page), cb_kwargs=dict(page=page))
+    failure = Failure(error)
+    failure.request = request
+    return failure
+
+
+def not_found(spider, page):
+    url = spider._make_listing_url(page)
+    return HttpError(HtmlResponse(url, status=404), "Ignoring non-200 response")
+
+
+def test_next_probe_gallops_then_bisects():
+    spider = fanout_spider()
+    assert spider._next_probe() == 1
+    spider._last_page_in_range = 4
+    assert spider._next_probe() == 8
+    spider._first_page_out_of_range = 8
+    assert spider._next_probe() == 6
+    spider._last_page_in_range = 7
+    assert spider._next_probe() is None
+
+
+def test_probe_past_the_last_page_ends_probing():
+    spider = fanout_spider()
+    spider._probed_pages = {0, 1, 2}
+    spider._last_page_in_range = 2
+    outputs = list(spider.probe_failed(probe_failure(spider, 4, not_found(spider, 4))))
+    # Page 3 is probed next, and the run may still move the bookmark
+    assert [request.cb_kwargs for request in outputs] == [dict(page=3)]
+    assert outputs[0].errback == spider.probe_failed
+    assert not spider.paging_failed
+
+    outputs = list(spider.probe_failed(probe_failure(spider, 3, not_found(spider, 3))))
+    assert [request.url for request in outputs] == []
+    assert spider.paging_complete and not spider.paging_failed
+
+
+def test_failed_probe_carries_on_without_moving_the_bookmark():
+    spider = fanout_spider()
+    spider._probed_pages = {0, 1}
+    spider._last_page_in_range = 1
+    outputs = list(spider.probe_failed(probe_failure(spider, 2, TimeoutError())))
+    # Page 1 is already scraped, so probing is over and no pages are left to fetch
+    assert outputs == []
+    assert spider.paging_complete and spider.paging_failed
+    assert spider.crawler.stats.get_value("bookmark/listing_failed") == 1
@@ -0,0 +1,21 @@
+from scraper.relevance import TermMatcher
+
+TERMS = ["covid", "sars-cov-2", "ncov", "coronavirus", "social distancing", "新冠"]
+
+
+def test_term_matcher_matches_variants():
+    matcher = TermMatcher(TERMS)
+    assert matcher.matches("Clinical features of COVID-19 patients")
+    assert matcher.matches("Spike proteins of SARS-CoV-2")
+    assert matcher.matches("Antibodies to SARS CoV 2")
+    assert matcher.matches("Early 2019-nCoV transmission")
+    assert matcher.matches("Effects of social\n distancing")
+    assert matcher.matches("新冠肺炎的临床特征")
+    assert matcher.matches(None, "An abstract about the novel coronavirus")
+
+
+def test_term_matcher_skips_unrelated():
+    matcher = TermMatcher(TERMS)
+    assert not matcher.matches("Gene expression in uncovered soil samples")
+    assert not matcher.matches("Protein folding", None, "")
+    assert not matcher.matches()
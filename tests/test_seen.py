@@ -0,0 +1,54 @@
+from itemadapter import ItemAdapter
+
+from scraper.items import ArticleItem
+from scraper.seen import BloomFilter, SeenIndex, article_fingerprint
+from scraper.spiders.china_archive import ChinaXIVSpider
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f"medrxiv_{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"biorxiv_{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_seen_index_tells_revisions_from_duplicates(tmp_path):
+    path = str(tmp_path / "seen.sqlite")
+    index = SeenIndex(path, capacity=10, error_rate=0.01)
+    assert not index.is_unchanged("medrxiv_1", "https://example.org/1v1")
+    index.add("medrxiv_1", "https://example.org/1v1")
+    assert index.is_unchanged("medrxiv_1", "https://example.org/1v1")
+    assert not index.is_unchanged("medrxiv_1", "https://example.org/1v2")
+    index.close()
+
+    # Reopened, the Bloom filter is rebuilt from the stored ids
+    index = SeenIndex(path, capacity=10, error_rate=0.01)
+    assert index.is_unchanged("medrxiv_1", "https://example.org/1v1")
+    index.add("medrxiv_1", "https://example.org/1v2")
+    assert not index.is_unchanged("medrxiv_1", "https://example.org/1v1")
+    index.close()
+
+
+def test_chinaxiv_fingerprint_changes_with_the_record():
+    spider = ChinaXIVSpider()
+    stub = {
+        "id": "202003.00001",
+        "url": "http://www.chinaxiv.org/abs/202003.00001",
+        "title": "A title",
+        "datestamp": "2020-03-01T10:00:00Z",
+    }
+    first = spider._get_article_fingerprint(stub)
+    revised = spider._get_article_fingerprint(
+        dict(stub, datestamp="2020-03-20T10:00:00Z")
+    )
+    assert first != revised
+
+    data = ArticleItem(id="chinaxiv_202003.00001", url=stub["url"], fingerprint=first)
+    assert article_fingerprint(data) == first
+    assert article_fingerprint(ArticleItem(url=stub["url"])) == stub["url"]
+
+    # Not a field, so it is never exported
+    assert "fingerprint" not in ItemAdapter(data).asdict()
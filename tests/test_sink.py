@@ -0,0 +1,25 @@
+from scraper.sink import NdjsonSink
+
+
+def open_sink(path):
+    return NdjsonSink(str(path), segment_bytes=200, fsync_batch=2, index_delta=3)
+
+
+def test_ndjson_sink_upsert_and_lookup(tmp_path):
+    sink = open_sink(tmp_path)
+    for n in range(10):
+        sink.append({"id": f"medrxiv_{n}", "url": f"https://example.org/{n}v1"})
+    sink.append({"id": "medrxiv_4", "url": "https://example.org/4v2"})
+    assert sink.get("medrxiv_4")["url"] == "https://example.org/4v2"
+    assert sink.get("medrxiv_11") is None
+    sink.close()
+    assert len(list(tmp_path.glob("log-*.ndjson"))) > 1
+
+    # Lines written after the last index merge are replayed when reopened
+    sink = open_sink(tmp_path)
+    sink.append({"id": "medrxiv_0", "url": "https://example.org/0v2"})
+    sink.close(merge=False)
+    sink = open_sink(tmp_path)
+    assert sink.get("medrxiv_0")["url"] == "https://example.org/0v2"
+    assert sink.get("medrxiv_9")["url"] == "https://example.org/9v1"
+    sink.close()
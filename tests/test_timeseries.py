@@ -0,0 +1,35 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from scraper.timeseries import TimeSeries, main
+
+
+def test_time_series_counts():
+    # Monday 2020-03-30 to Tuesday 2020-04-07, nothing posted on 04-01 to 04-05
+    days = [datetime.date(2020, 3, 30) + datetime.timedelta(n) for n in (0, 0, 1, 7, 8)]
+    series = TimeSeries([day.toordinal() for day in days], [0, 1, 0, 0, 1])
+
+    dates, counts = series.daily()
+    assert dates[0] == np.datetime64("2020-03-30")
+    assert list(counts) == [2, 1, 0, 0, 0, 0, 0, 1, 1]
+    assert list(series.daily("revision")[1][:2]) == [1, 0]
+
+    dates, counts = series.weekly()
+    assert list(dates.astype(str)) == ["2020-03-30", "2020-04-06"]
+    assert list(counts) == [3, 2]
+    assert list(series.cumulative(freq="weekly")[1]) == [3, 5]
+    assert list(series.split("weekly")[1]) == [2, 1]
+
+    means = series.rolling_mean(2)[1]
+    assert np.isnan(means[0]) and list(means[1:3]) == [1.5, 0.5]
+
+
+def test_rolling_window_must_be_a_period_or_more(capsys):
+    series = TimeSeries([datetime.date(2020, 3, 30).toordinal()], [0])
+    with pytest.raises(ValueError):
+        series.rolling_mean(0)
+    with pytest.raises(SystemExit):
+        main(["medrxiv", "--rolling", "0"])
+    assert "--rolling: must be at least 1" in capsys.readouterr().err